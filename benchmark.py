@@ -0,0 +1,152 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+from datetime import datetime
+
+import profiling
+
+BENCH_DIR = 'synthetic'
+BASELINE_PATH = 'benchmark_baseline.json'
+# Changes smaller than this are timer noise, whatever the percentage
+NOISE_SECONDS = 0.05
+
+
+def dataset_dir(scale):
+    return os.path.join(BENCH_DIR, f"{scale:g}x")
+
+
+def ensure_dataset(scale, seed=0):
+    """Generate the synthetic dataset for `scale` unless it is already there."""
+    from synthetic_data import generate
+
+    out_dir = dataset_dir(scale)
+    if not os.path.exists(os.path.join(out_dir, 'Dish-cleaned.csv')):
+        generate(out_dir, scale, seed)
+    return out_dir
+
+
+def _run_child(warm):
+    """Runs inside the benchmark subprocess, with the dataset as working directory."""
+    from data_cache import clear_cache
+    from data_quality_assessment import assess_data_quality
+    from script import main
+
+    if not warm:
+        clear_cache()
+    profiling.record()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        main()
+        assess_data_quality()
+    stages = profiling.stop()
+    # Stages reset the kernel's peak-RSS counter, so the run's peak is the largest stage peak
+    peak_mb = max([s['peak_rss_mb'] for s in stages] + [resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024])
+    print(json.dumps({'stages': {f"{s['run']}.{s['stage']}": s['wall_s'] for s in stages}, 'peak_rss_mb': peak_mb}))
+
+
+def run_once(data_dir, warm=False):
+    """Time every stage of main() and assess_data_quality() in a fresh process."""
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'] + (['--warm'] if warm else []),
+                            cwd=data_dir, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"benchmark run in {data_dir} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark(scale, repeat=3, warm=False):
+    """
+    Best-of-`repeat` stage timings and the largest peak RSS for one scale.
+
+    Each repeat runs in its own process, so peak RSS covers one run of
+    main() plus assess_data_quality(). Cold runs (the default) clear the
+    columnar cache first, so load stages include CSV parsing. Warm runs do
+    one untimed run to fill the cache.
+    """
+    data_dir = ensure_dataset(scale)
+    if warm:
+        run_once(data_dir, warm=True)
+    runs = [run_once(data_dir, warm) for _ in range(repeat)]
+    stages = {name: min(run['stages'][name] for run in runs) for name in runs[0]['stages']}
+    stages['total'] = sum(stages.values())
+    return {'stages': stages, 'peak_rss_mb': max(run['peak_rss_mb'] for run in runs)}
+
+
+def load_baselines(path=BASELINE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(results, path=BASELINE_PATH):
+    """Merge results into the baseline file, keyed by scale and cache mode."""
+    baselines = load_baselines(path)
+    meta = {'saved': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+            'machine': platform.machine(), 'cpus': os.cpu_count()}
+    for key, result in results.items():
+        baselines[key] = {**result, 'meta': meta}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+def compare(key, result, baseline, threshold):
+    """Print a stage table against the baseline. Returns the stages that regressed."""
+    print(f"\n{key}: peak RSS {result['peak_rss_mb']:,.0f} MB"
+          + (f" (baseline {baseline['peak_rss_mb']:,.0f} MB)" if baseline else ""))
+    print(f"{'Stage':<28} {'Seconds':>9} {'Baseline':>9} {'Change':>8}")
+    print("-" * 58)
+    regressions = []
+    for name, seconds in result['stages'].items():
+        old = baseline['stages'].get(name) if baseline else None
+        if old is None:
+            print(f"{name:<28} {seconds:>9.3f} {'-':>9} {'':>8}")
+            continue
+        change = (seconds - old) / old if old else 0.0
+        flag = ''
+        if change > threshold and seconds - old > NOISE_SECONDS:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<28} {seconds:>9.3f} {old:>9.3f} {100 * change:>+7.1f}%{flag}")
+    if baseline and result['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + threshold):
+        print(f"{'peak_rss_mb':<28} REGRESSION")
+        regressions.append('peak_rss_mb')
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stage-level benchmark of script.py and the quality report "
+                                                 "on synthetic data")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0],
+                        help="dataset sizes as multiples of the real export, e.g. 1 10 100")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warm', action='store_true', help="measure with the columnar cache already built")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="slowdown that counts as a regression (default 0.2 = 20%%)")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_child(args.warm)
+        sys.exit(0)
+
+    baselines = load_baselines(args.baseline)
+    results, regressions = {}, []
+    for scale in args.scales:
+        key = f"{scale:g}x-{'warm' if args.warm else 'cold'}"
+        results[key] = benchmark(scale, args.repeat, args.warm)
+        regressions += [f"{key}:{name}" for name in
+                        compare(key, results[key], baselines.get(key), args.threshold)]
+
+    if args.save:
+        save_baselines(results, args.baseline)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
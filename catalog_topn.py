@@ -0,0 +1,122 @@
+import argparse
+import heapq
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from decade_stats import grouped_quantile, print_rankings
+from dish_clusters import canonical_dishes, canonical_ids, load_mapping
+from streaming_join import avg_prices, iter_menu_items, join_menus, menu_lookup, page_lookup
+from table_schemas import SOURCE_FILES, load_source
+
+
+def _top_k(counts, k, names):
+    """
+    The k most frequent dishes in a {dish_id: count} Counter.
+
+    A size-k heap finds the k-th largest count. Every dish that reaches it
+    is then sorted by (-count, name), so ties break by dish name as in
+    decade_stats.rank_dishes.
+    """
+    if len(counts) > k:
+        kth = heapq.nlargest(k, counts.values())[-1]
+        candidates = [(dish, n) for dish, n in counts.items() if n >= kth]
+    else:
+        candidates = list(counts.items())
+    return sorted(candidates, key=lambda item: (-item[1], names.get(item[0], '')))[:k]
+
+
+def _compact(parts):
+    return [pd.concat(parts).groupby(level=[0, 1, 2]).sum()]
+
+
+def catalog_top_n(n=5, width=10, menuitem_path=SOURCE_FILES['MenuItem'], chunksize=200_000, dish_map=None):
+    """
+    True top-n dishes per decade (or `width`-year bucket) across every dish.
+
+    MenuItem is streamed once in chunks. Each chunk is joined to its menu's
+    year and reduced to (bucket, dish) counts, which are merged into one
+    Counter per bucket. The chunk's avg_price value counts are merged too,
+    so medians for the winners need no second pass. Memory grows with the
+    number of distinct (bucket, dish) and (bucket, dish, price)
+    combinations, not with the number of rows. Top-n per bucket is taken
+    with a bounded heap at the end. With a dish_map (see
+    dish_clusters.load_mapping), dishes are counted and ranked by
+    canonical dish.
+
+    Returns the same columns as decade_stats.rank_dishes, plus dish_id.
+    """
+    menus = menu_lookup(load_source('Menu'))
+    page_menu = page_lookup(load_source('MenuPage'))
+    dish_df = load_source('Dish')
+    if dish_map is not None:
+        dish_df = canonical_dishes(dish_df, dish_map)
+    dish_index = pd.Index(dish_df['id'])
+
+    counts = defaultdict(Counter)
+    price_parts = []
+    for chunk in iter_menu_items(menuitem_path, chunksize):
+        if dish_map is not None:
+            chunk = chunk.assign(dish_id=canonical_ids(chunk['dish_id'], dish_map))
+        chunk = chunk[chunk['dish_id'].isin(dish_index)]
+        chunk, menu = join_menus(chunk, page_menu, menus)
+        keys = pd.DataFrame({
+            'bucket': menu['year'].to_numpy() // width * width,
+            'dish_id': chunk['dish_id'].to_numpy(dtype=np.int64),
+            'price': avg_prices(chunk['price'], chunk['high_price']),
+        })
+        for (bucket, dish), count in keys.groupby(['bucket', 'dish_id']).size().items():
+            counts[bucket][dish] += count
+        price_parts.append(keys.dropna(subset=['price']).groupby(['bucket', 'dish_id', 'price']).size())
+        if len(price_parts) >= 8:
+            price_parts = _compact(price_parts)
+
+    names = dish_df.set_index('id')['name'].astype(object).to_dict()
+    return rank_buckets(counts, _compact(price_parts)[0] if price_parts else None, names, n)
+
+
+def rank_buckets(counts, price_counts, names, n=5):
+    """
+    Top-n rows per bucket from merged counts.
+
+    counts maps bucket -> Counter({dish_id: count}). price_counts is a
+    Series of avg_price value counts indexed by (bucket, dish_id, price),
+    or None. names maps dish_id -> name. Medians come from the price
+    counts of the winning dishes only.
+    """
+    rows = []
+    for bucket in sorted(counts):
+        bucket_counts = counts[bucket]
+        total = sum(bucket_counts.values())
+        for rank, (dish, frequency) in enumerate(_top_k(bucket_counts, n, names), 1):
+            rows.append((int(bucket), rank, dish, names.get(dish), frequency, frequency / total, total))
+    results = pd.DataFrame(rows, columns=['decade', 'rank', 'dish_id', 'dish_name', 'frequency', 'share',
+                                          'bucket_total'])
+
+    if price_counts is not None and len(results):
+        prices = price_counts.rename('n').reset_index()
+        prices = prices.merge(results[['decade', 'dish_id']].rename(columns={'decade': 'bucket'}),
+                              on=['bucket', 'dish_id'])
+        medians = grouped_quantile(prices, ['bucket', 'dish_id'], 0.5) if len(prices) \
+            else pd.Series(dtype=np.float64)
+        results['median_price'] = medians.reindex(
+            pd.MultiIndex.from_frame(results[['decade', 'dish_id']])).to_numpy()
+    else:
+        results['median_price'] = np.nan
+
+    return results[['decade', 'rank', 'dish_id', 'dish_name', 'frequency', 'share', 'median_price', 'bucket_total']]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="True per-decade top-N across the whole dish catalog")
+    parser.add_argument('--n', type=int, default=5)
+    parser.add_argument('--width', type=int, default=10, help="bucket width in years (10 = decades)")
+    parser.add_argument('--clusters', metavar='PATH', help="rank by canonical dish using this dish_clusters.py mapping")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = catalog_top_n(args.n, args.width, dish_map=load_mapping(args.clusters) if args.clusters else None)
+    print_rankings(results)
+    print(f"\nComputed in {time.perf_counter() - start:.1f}s")
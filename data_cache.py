@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from parallel_csv import read_csv_parallel
+
+CACHE_DIR = '.table_cache'
+MANIFEST = 'manifest.json'
+
+
+def file_fingerprint(path):
+    """Cheap change detector for a source file: size and modification time."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file's contents, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _options_key(read_csv_kwargs):
+    encoded = json.dumps(read_csv_kwargs, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:12]
+
+
+def _table_dir(csv_path, cache_dir, read_csv_kwargs):
+    # The key covers the file's absolute path, so same-named CSVs in different directories don't share a cache
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    key = _options_key({'source': os.path.realpath(csv_path), **read_csv_kwargs})
+    return os.path.join(cache_dir, f"{name}-{key}")
+
+
+def _read_manifest(table_dir):
+    try:
+        with open(os.path.join(table_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_manifest(table_dir, manifest):
+    tmp_path = os.path.join(table_dir, MANIFEST + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(table_dir, MANIFEST))
+
+
+def _write_column(table_dir, index, series):
+    """Write one column as .npy files and return its manifest entry.
+
+    Numeric columns are stored as-is so they can be memory-mapped back.
+    Strings (object or categorical) are dictionary-encoded: int32 codes in
+    a .npy file plus the distinct values in a JSON side file.
+    """
+    base = os.path.join(table_dir, f"c{index}")
+    entry = {'name': series.name, 'dtype': str(series.dtype)}
+
+    if isinstance(series.dtype, pd.CategoricalDtype) or not (
+            pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype)):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            categories = series.cat.categories
+            entry['kind'] = 'category'
+        else:
+            codes, categories = pd.factorize(series, use_na_sentinel=True)
+            entry['kind'] = 'strings'
+        np.save(base + '.codes.npy', codes.astype(np.int32))
+        with open(base + '.values.json', 'w', encoding='utf-8') as f:
+            json.dump(np.asarray(categories, dtype=object).tolist(), f, default=str)
+    elif pd.api.types.is_extension_array_dtype(series.dtype):
+        # Nullable integers/booleans: plain values plus a separate null mask
+        mask = series.isna().to_numpy()
+        numpy_dtype = series.dtype.numpy_dtype
+        np.save(base + '.npy', series.to_numpy(dtype=numpy_dtype, na_value=0))
+        np.save(base + '.mask.npy', mask)
+        entry['kind'] = 'masked'
+    else:
+        np.save(base + '.npy', series.to_numpy())
+        entry['kind'] = 'plain'
+    return entry
+
+
+def _read_column(table_dir, index, entry):
+    base = os.path.join(table_dir, f"c{index}")
+    kind = entry['kind']
+
+    if kind in ('category', 'strings'):
+        codes = np.load(base + '.codes.npy')
+        with open(base + '.values.json', encoding='utf-8') as f:
+            values = json.load(f)
+        if kind == 'category':
+            return pd.Categorical.from_codes(codes, categories=values)
+        lookup = np.empty(len(values) + 1, dtype=object)
+        lookup[:-1] = values
+        lookup[-1] = np.nan  # code -1 indexes the trailing NaN slot
+        column = lookup[codes]
+        if entry['dtype'] != 'object':
+            return pd.array(column, dtype=entry['dtype'])
+        return column
+    if kind == 'masked':
+        values = np.load(base + '.npy')
+        mask = np.load(base + '.mask.npy')
+        return pd.arrays.IntegerArray(values, mask) if values.dtype.kind in 'iu' \
+            else pd.array(np.where(mask, None, values), dtype=entry['dtype'])
+    # Copy-on-write mapping: pages come straight from the page cache and
+    # callers may still modify the frame without touching the file
+    return np.load(base + '.npy', mmap_mode='c').view(np.ndarray)
+
+
+def _build_cache(csv_path, table_dir, read_csv_kwargs, astype, fingerprint, content_hash):
+    df = read_csv_parallel(csv_path, **read_csv_kwargs)
+    if astype:
+        df = df.astype(astype)
+
+    write_frame(table_dir, df, source=os.path.abspath(csv_path), sha256=content_hash, **fingerprint)
+    return df
+
+
+def write_frame(table_dir, df, **fields):
+    """
+    Write a DataFrame to table_dir in the cache's columnar format.
+
+    Any existing directory is replaced. Extra keyword fields are stored in
+    the manifest, which is written last so a half-written frame is never
+    picked up.
+    """
+    if os.path.isdir(table_dir):
+        shutil.rmtree(table_dir)
+    os.makedirs(table_dir)
+
+    columns = [_write_column(table_dir, i, df[name]) for i, name in enumerate(df.columns)]
+    _write_manifest(table_dir, {**fields, 'rows': len(df), 'columns': columns})
+
+
+def read_frame(table_dir, manifest=None):
+    """Load a frame written by write_frame(), memory-mapping numeric columns."""
+    manifest = manifest or _read_manifest(table_dir)
+    data = {entry['name']: _read_column(table_dir, i, entry)
+            for i, entry in enumerate(manifest['columns'])}
+    return pd.DataFrame(data, copy=False)
+
+
+def load_table(csv_path, cache_dir=CACHE_DIR, astype=None, **read_csv_kwargs):
+    """
+    Load a CSV through the columnar cache.
+
+    The first load parses the CSV with pd.read_csv(csv_path, **read_csv_kwargs)
+    and writes each column to cache_dir as .npy files. Later loads
+    memory-map those files instead of parsing. The cache is reused while the
+    CSV's size and mtime are unchanged. If either changes, the CSV is
+    hashed, and the cache is rebuilt only when the hash changed too.
+    If astype is given, the parsed frame is converted with df.astype(astype)
+    before it is cached. Each source file and set of options gets its own cache.
+    """
+    table_dir = _table_dir(csv_path, cache_dir, {'astype': astype, **read_csv_kwargs})
+    fingerprint = file_fingerprint(csv_path)
+    manifest = _read_manifest(table_dir)
+
+    content_hash = None
+    if manifest is not None and (manifest['size'], manifest['mtime_ns']) != (fingerprint['size'], fingerprint['mtime_ns']):
+        content_hash = file_hash(csv_path)
+        if content_hash == manifest['sha256']:
+            # Touched but not modified: refresh the fingerprint and keep the cache
+            manifest.update(fingerprint)
+            _write_manifest(table_dir, manifest)
+        else:
+            manifest = None
+
+    if manifest is None:
+        if content_hash is None:
+            content_hash = file_hash(csv_path)
+        return _build_cache(csv_path, table_dir, read_csv_kwargs, astype, fingerprint, content_hash)
+
+    return read_frame(table_dir, manifest)
+
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """Remove every cached table."""
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    for path in sys.argv[1:] or ['Menu.csv', 'MenuPage.csv', 'MenuItem-cleaned.csv', 'Dish-cleaned.csv']:
+        start = time.perf_counter()
+        df = load_table(path)
+        print(f"{path}: {len(df):,} rows in {time.perf_counter() - start:.3f}s")
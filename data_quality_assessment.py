@@ -1,7 +1,14 @@
+import argparse
+
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
+from integrity_checks import RAW_FILES, check_constraints
+from profiling import TRACE_ENV, begin, enable, finish, rows, stage
+from quality_diff import change_summary, diff_table, score_name_changes
+from table_schemas import SOURCE_FILES, load_source
+
 def assess_data_quality():
     """
     Data Quality Assessment: Two-Stage Cleaning Analysis
@@ -16,15 +23,17 @@ def assess_data_quality():
     
     # Load all datasets for comparison
     print("\nLoading datasets for comparison...")
+    begin('quality')
+    stage('load')
     
     try:
         # Original data
-        dish_original = pd.read_csv('Dish.csv')
-        menuitem_original = pd.read_csv('MenuItem.csv')
+        dish_original = load_source('Dish', 'Dish.csv')
+        menuitem_original = load_source('MenuItem', 'MenuItem.csv')
         
         # OpenRefine cleaned data
-        dish_cleaned = pd.read_csv('Dish-cleaned.csv')
-        menuitem_cleaned = pd.read_csv('MenuItem-cleaned.csv')
+        dish_cleaned = load_source('Dish')
+        menuitem_cleaned = load_source('MenuItem')
         
         # Final processed dataset
         final_dataset = pd.read_csv('final_cleaned_dataset.csv')
@@ -32,9 +41,12 @@ def assess_data_quality():
         print(f"Original data: {len(dish_original):,} dishes, {len(menuitem_original):,} menu items")
         print(f"Cleaned data: {len(dish_cleaned):,} dishes, {len(menuitem_cleaned):,} menu items")
         print(f"Final dataset: {len(final_dataset):,} analysis-ready records")
+        rows(len(dish_original) + len(menuitem_original) + len(dish_cleaned) + len(menuitem_cleaned)
+             + len(final_dataset))
         
     except FileNotFoundError as e:
         print(f"Error: Required file not found - {e}")
+        finish()
         return
     
     print("\n" + "="*60)
@@ -47,33 +59,42 @@ def assess_data_quality():
     
     print("\n1.1 DISH DATA CLEANING")
     print("-" * 30)
+    stage('dish_diff')
     
     # Record count changes
     dish_records_removed = len(dish_original) - len(dish_cleaned)
     print(f"Records: {len(dish_original):,} -> {len(dish_cleaned):,} ({dish_records_removed:,} removed)")
     
-    # Example dish name improvements (sample a few for demonstration)
-    print("\nExample dish name improvements:")
+    # Align original and cleaned dishes by id once and classify every change
+    dish_changes = diff_table(dish_original, dish_cleaned, ['name'])
+    name_changes = score_name_changes(dish_changes)
+    rows(len(dish_changes))
     
-    # Find some dishes that exist in both datasets for comparison
-    common_ids = set(dish_original['id']) & set(dish_cleaned['id'])
-    sample_ids = list(common_ids)[:5]  # Take first 5 for examples
+    print("\nDish change classification:")
+    for kind, count in change_summary(dish_changes).items():
+        print(f"  {kind}: {count:,}")
     
-    for dish_id in sample_ids:
-        orig_name = dish_original[dish_original['id'] == dish_id]['name'].iloc[0]
-        clean_name = dish_cleaned[dish_cleaned['id'] == dish_id]['name'].iloc[0]
-        if orig_name != clean_name:
-            print(f"  ID {dish_id}: '{orig_name}' -> '{clean_name}'")
-        else:
-            print(f"  ID {dish_id}: '{orig_name}' (no change needed)")
+    print("\nExample dish name improvements:")
+    for row in name_changes.sort_values('id').head(5).itertuples(index=False):
+        print(f"  ID {row.id}: '{row.original}' -> '{row.cleaned}' ({row.kind})")
     
     print("\n1.2 MENU ITEM DATA CLEANING")
     print("-" * 30)
+    stage('menuitem_diff')
     
     # Record count changes
     menuitem_records_removed = len(menuitem_original) - len(menuitem_cleaned)
     print(f"Records: {len(menuitem_original):,} -> {len(menuitem_cleaned):,} ({menuitem_records_removed:,} removed)")
     
+    # Align original and cleaned menu items by id once and classify every change
+    menuitem_changes = diff_table(menuitem_original, menuitem_cleaned,
+                                  ['menu_page_id', 'price', 'high_price', 'dish_id'])
+    rows(len(menuitem_changes))
+    
+    print("Menu item change classification:")
+    for (column, kind), count in menuitem_changes.groupby(['column', 'kind'], dropna=False).size().items():
+        print(f"  {column if pd.notna(column) else 'row'}: {kind}: {count:,}")
+    
     # Price data improvements
     orig_price_null = menuitem_original['price'].isnull().sum()
     clean_price_null = menuitem_cleaned['price'].isnull().sum()
@@ -104,10 +125,12 @@ def assess_data_quality():
     
     print("\n2.1 DATA SCOPE REFINEMENT")
     print("-" * 30)
+    stage('final_checks')
     
     # Data reduction analysis
     original_total = len(menuitem_cleaned)
     final_total = len(final_dataset)
+    rows(final_total)
     reduction_pct = ((original_total - final_total) / original_total) * 100
     
     print(f"Data scope refinement:")
@@ -217,7 +240,24 @@ def assess_data_quality():
     print(f"  Stage 2 scope refinement: {reduction_pct:.1f}% focused")
     print(f"  Final dataset completeness: {date_validity_pct:.1f}% dates, {price_validity_pct:.1f}% prices")
     
+    print("\n3.4 CONSTRAINT VIOLATIONS (FULL TABLES)")
+    print("-" * 30)
+    stage('integrity')
+    
+    # Referential integrity, domain rules and duplicate ids, before and after cleaning
+    raw_violations = check_constraints(RAW_FILES)
+    cleaned_violations = check_constraints(SOURCE_FILES)
+    violations = raw_violations[['constraint', 'checked', 'violations']].merge(
+        cleaned_violations[['constraint', 'violations']], on='constraint', suffixes=('_raw', '_cleaned'))
+    # Every constraint checks all of its table's rows; count each table's rows once
+    rows(raw_violations.groupby('table')['checked'].max().sum()
+         + cleaned_violations.groupby('table')['checked'].max().sum())
+    print(f"{'Constraint':<40} {'Raw':>9} {'Cleaned':>9}")
+    for row in violations.itertuples(index=False):
+        print(f"{row.constraint:<40} {row.violations_raw:>9,} {row.violations_cleaned:>9,}")
+    
     # Save comprehensive report
+    stage('report_write')
     report_file = 'data_quality_analysis_report.txt'
     with open(report_file, 'w', encoding='utf-8') as f:
         f.write("═══════════════════════════════════════════════════════════════\n")
@@ -249,46 +289,13 @@ def assess_data_quality():
         f.write("• Format consistency enforcement\n\n")
         
         f.write("Sample Corrections in Dish.csv:\n")
-        # Find dishes with interesting corrections, particularly punctuation and formatting
-        common_ids = set(dish_original['id']) & set(dish_cleaned['id'])
-        interesting_changes = []
-        
-        for dish_id in list(common_ids)[:50]:  # Check first 50 for variety
-            if dish_id in dish_original['id'].values and dish_id in dish_cleaned['id'].values:
-                orig_name = dish_original[dish_original['id'] == dish_id]['name'].iloc[0]
-                clean_name = dish_cleaned[dish_cleaned['id'] == dish_id]['name'].iloc[0]
-                
-                if orig_name != clean_name:
-                    # Prioritize punctuation, case, and formatting changes
-                    has_punct_diff = any(c in orig_name + clean_name for c in '.,;:!?()[]{}"\'-')
-                    has_case_diff = orig_name.lower() == clean_name.lower() and orig_name != clean_name
-                    has_spacing_diff = len(orig_name.split()) != len(clean_name.split())
-                    
-                    # Score changes by interest level
-                    score = 0
-                    if has_punct_diff: score += 3
-                    if has_case_diff: score += 2  
-                    if has_spacing_diff: score += 2
-                    if len(orig_name) != len(clean_name): score += 1
-                    
-                    interesting_changes.append((score, dish_id, orig_name, clean_name))
+        # Most instructive corrections across every changed dish name
+        for i, row in enumerate(name_changes.head(6).itertuples(index=False)):
+            f.write(f"  {i+1}. ID {row.id}: '{row.original}' → '{row.cleaned}'\n")
         
-        # Sort by most interesting and take top examples
-        interesting_changes.sort(reverse=True)
-        
-        # If we have interesting changes, show them; otherwise fall back to first few
-        if interesting_changes:
-            for i, (score, dish_id, orig_name, clean_name) in enumerate(interesting_changes[:6]):
-                f.write(f"  {i+1}. ID {dish_id}: '{orig_name}' → '{clean_name}'\n")
-        else:
-            # Fallback to first few changes
-            sample_ids = list(common_ids)[:6]
-            for i, dish_id in enumerate(sample_ids):
-                if dish_id in dish_original['id'].values and dish_id in dish_cleaned['id'].values:
-                    orig_name = dish_original[dish_original['id'] == dish_id]['name'].iloc[0]
-                    clean_name = dish_cleaned[dish_cleaned['id'] == dish_id]['name'].iloc[0]
-                    if orig_name != clean_name:
-                        f.write(f"  {i+1}. ID {dish_id}: '{orig_name}' → '{clean_name}'\n")
+        f.write("\nDish.csv change classification:\n")
+        for kind, count in change_summary(dish_changes).items():
+            f.write(f"  • {kind}: {count:,}\n")
         f.write("\n")
         
         f.write("MENUITEM.CSV IMPROVEMENTS:\n")
@@ -308,6 +315,11 @@ def assess_data_quality():
         f.write(f"  • Original null prices: {orig_price_null:,}\n")
         f.write(f"  • Cleaned null prices: {clean_price_null:,}\n\n")
         
+        f.write("MenuItem.csv change classification:\n")
+        for kind, count in change_summary(menuitem_changes).items():
+            f.write(f"  • {kind}: {count:,}\n")
+        f.write("\n")
+        
         f.write("STAGE 2: PROCESSING PIPELINE REFINEMENTS\n")
         f.write("──────────────────────────────────────────\n\n")
         
@@ -330,6 +342,15 @@ def assess_data_quality():
         f.write(f"• Price Coverage: {price_validity_pct:.1f}% ({valid_prices:,}/{len(final_dataset):,} records)\n")
         f.write(f"• Complete Records: {len(final_dataset):,} analysis-ready entries\n\n")
         
+        f.write("CONSTRAINT VIOLATIONS (FULL TABLES, RAW → CLEANED):\n")
+        for row in violations.itertuples(index=False):
+            f.write(f"• {row.constraint}: {row.violations_raw:,} → {row.violations_cleaned:,}"
+                    f" of {row.checked:,} rows\n")
+        for row in cleaned_violations[cleaned_violations['violations'] > 0].itertuples(index=False):
+            sample = ', '.join(str(s['id']) for s in row.samples)
+            f.write(f"  Sample ids still violating {row.constraint}: {sample}\n")
+        f.write("\n")
+        
         f.write("TEMPORAL COVERAGE ANALYSIS:\n")
         if len(final_dataset) > 0:
             min_year = final_dataset['year'].min()
@@ -368,6 +389,7 @@ def assess_data_quality():
     
     print(f"\nComprehensive report saved to: {report_file}")
     print("Data quality assessment complete.")
+    finish()
     
     return {
         'stage1_improvements': total_improvement,
@@ -378,4 +400,11 @@ def assess_data_quality():
     }
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Data quality assessment of the cleaning pipeline")
+    parser.add_argument('--trace', metavar='PATH', nargs='?', const='trace.json',
+                        help="write per-stage wall time, CPU time, peak RSS and row counts to a JSON trace "
+                             f"(default trace.json; or set {TRACE_ENV}=PATH)")
+    args = parser.parse_args()
+    if args.trace:
+        enable(args.trace)
     quality_metrics = assess_data_quality()
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+
+def rank_dishes(df, n=5, width=10, bucket_col='decade', dish_col='dish_name', price_col='avg_price'):
+    """
+    Top-n dishes per time bucket, computed in one grouped pass.
+
+    Rows are bucketed by `year // width * width` (width=10 gives decades,
+    width=1 single years) and grouped by (bucket, dish). Each group's size
+    and native median price are computed together, then ranked within the
+    bucket by frequency. Ties are broken by dish name, matching
+    DataFrame.nlargest on a name-sorted groupby.
+
+    Returns one row per (bucket, rank) with columns bucket_col, rank,
+    dish_col, frequency, share (of the bucket's rows), median_price and
+    bucket_total.
+    """
+    buckets = (df['year'] // width * width).astype('int64').rename(bucket_col)
+    stats = (df.groupby([buckets, df[dish_col]], observed=True, sort=False)[price_col]
+             .agg(['size', 'median'])
+             .rename(columns={'size': 'frequency', 'median': 'median_price'})
+             .reset_index())
+
+    totals = buckets.value_counts()
+    stats['bucket_total'] = stats[bucket_col].map(totals).to_numpy()
+    stats['share'] = stats['frequency'] / stats['bucket_total']
+
+    stats = stats.sort_values([bucket_col, 'frequency', dish_col], ascending=[True, False, True],
+                              kind='stable', ignore_index=True)
+    stats['rank'] = stats.groupby(bucket_col, sort=False).cumcount() + 1
+    stats = stats[stats['rank'] <= n]
+
+    return stats[[bucket_col, 'rank', dish_col, 'frequency', 'share', 'median_price', 'bucket_total']] \
+        .reset_index(drop=True)
+
+
+def grouped_quantile(prices, keys, q):
+    """
+    Quantile q of each group in a (keys..., price, n) value-count table.
+
+    Matches np.quantile's default linear interpolation over the expanded
+    values. q=0.5 therefore gives the same result as np.median.
+    """
+    prices = prices.sort_values(keys + ['price'], kind='stable', ignore_index=True)
+    grouped = prices.groupby(keys, sort=False)
+    cum = grouped['n'].cumsum().to_numpy()
+    total = grouped['n'].transform('sum').to_numpy()
+
+    h = (total - 1) * q
+    lo, hi = np.floor(h), np.ceil(h)
+    group_keys = [prices[k] for k in keys]
+    # The first row whose running count passes k holds the k-th smallest value
+    v_lo = prices['price'][cum > lo].groupby([k[cum > lo] for k in group_keys]).first()
+    v_hi = prices['price'][cum > hi].groupby([k[cum > hi] for k in group_keys]).first()
+    frac = pd.Series(h - lo).groupby(group_keys).first()
+    if q == 0.5:
+        return v_lo.where(frac != 0.5, (v_lo + v_hi) / 2)
+    return v_lo + frac * (v_hi - v_lo)
+
+
+def print_rankings(results, bucket_col='decade'):
+    """Print rank_dishes-style results: each bucket's total, then its ranked dishes with median prices."""
+    for bucket, bucket_results in results.groupby(bucket_col, sort=True):
+        total_records = bucket_results['bucket_total'].iloc[0]
+
+        print(f"{bucket}s ({total_records:,} total records):")
+        print("   " + "-" * 45)
+
+        for row in bucket_results.itertuples(index=False):
+            price_str = f"${row.median_price:.2f}" if pd.notna(row.median_price) else "No price"
+            print(f"   {row.rank}. {row.dish_name:<15} {row.frequency:>4}x ({100 * row.share:4.1f}%) - {price_str}")
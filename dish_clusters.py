@@ -0,0 +1,409 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from table_schemas import load_source
+
+CLUSTERS_PATH = 'dish_clusters.csv'
+
+# OpenRefine strips punctuation and control characters before keying
+PUNCTUATION = r'[^\w\s]|_'
+# Candidate pairs per vectorized MinHash comparison
+SIGNATURE_BATCH = 1_000_000
+
+
+def _ascii_lower(names):
+    """Lower-case, with accents folded to ASCII (é -> e)."""
+    folded = names.astype(object).where(names.notna(), '').astype(str).str.normalize('NFKD')
+    return folded.str.encode('ascii', 'ignore').str.decode('ascii').str.lower()
+
+
+def fingerprint(names):
+    """
+    OpenRefine's fingerprint key: lower-case, ASCII-folded, punctuation
+    removed, then the unique whitespace-separated tokens sorted and joined.
+    "COFFEE", "Coffee." and "coffee" all key to "coffee".
+    """
+    tokens = _ascii_lower(names).str.replace(PUNCTUATION, '', regex=True).str.split()
+    return tokens.map(lambda words: ' '.join(sorted(set(words))))
+
+
+def squashed_key(names):
+    """
+    Lower-case, ASCII-folded name with whitespace and punctuation removed.
+    "Ice Cream", "ice-cream" and "icecream" key the same.
+    """
+    return _ascii_lower(names).str.replace(r'[^\w]|_', '', regex=True)
+
+
+def ngram_fingerprint(names, n=2):
+    """
+    OpenRefine's n-gram fingerprint key: the sorted unique character
+    n-grams of squashed_key. Looser than squashed_key, since the grams lose
+    their order: "Squab" and "Squash" collide on bigrams.
+    """
+    squashed = squashed_key(names)
+    return squashed.map(lambda s: ''.join(sorted({s[i:i + n] for i in range(len(s) - n + 1)}))
+                        if len(s) >= n else s)
+
+
+def _gram_table(keys, n, batch=10_000):
+    """
+    One row per (key position, distinct character n-gram) of each key.
+
+    Keys are laid out as a fixed-width matrix of code points, and each gram
+    is packed into one integer, 21 bits per character. Keys shorter than n
+    are a single gram of their own.
+    """
+    if n > 3:
+        raise ValueError("grams longer than 3 characters don't fit in an int64")
+    keys = np.asarray(keys, dtype=str)
+    width = max(keys.dtype.itemsize // 4, n)
+    lengths = np.char.str_len(keys)
+    parts = []
+    for start in range(0, len(keys), batch):
+        chars = np.zeros((len(keys[start:start + batch]), width), dtype=np.int64)
+        chars[:, :keys.dtype.itemsize // 4] = keys[start:start + batch].view(np.uint32).reshape(len(chars), -1)
+        grams = np.zeros((len(chars), width - n + 1), dtype=np.int64)
+        for j in range(n):
+            grams = grams << 21 | chars[:, j:width - n + 1 + j]
+        valid = np.arange(width - n + 1) < np.maximum(lengths[start:start + batch] - n + 1, 1)[:, None]
+        rows, cols = np.nonzero(valid)
+        parts.append(pd.DataFrame({'key': rows + start, 'gram': grams[rows, cols]}))
+    return pd.concat(parts, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def _minhash(code, offsets, hashes, seed):
+    """MinHash signatures (hashes x keys) of each key's gram codes; rows are sorted by key."""
+    rng = np.random.default_rng(seed)
+    prime = (1 << 31) - 1
+    a = rng.integers(1, prime, hashes)
+    b = rng.integers(0, prime, hashes)
+    signatures = np.empty((hashes, len(offsets) - 1), dtype=np.int64)
+    for h in range(hashes):
+        signatures[h] = np.minimum.reduceat((a[h] * code + b[h]) % prime, offsets[:-1])
+    return signatures
+
+
+def _bucket_pairs(buckets):
+    """All (i, j), i < j, of positions that share a bucket label."""
+    order = np.argsort(buckets, kind='stable')
+    sorted_buckets = buckets[order]
+    pairs_a, pairs_b = [], []
+    step = 1
+    while step < len(order):
+        same = sorted_buckets[step:] == sorted_buckets[:-step]
+        if not same.any():
+            break
+        pairs_a.append(order[:-step][same])
+        pairs_b.append(order[step:][same])
+        step += 1
+    if not pairs_a:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    a, b = np.concatenate(pairs_a), np.concatenate(pairs_b)
+    return np.minimum(a, b), np.maximum(a, b)
+
+
+def _band_buckets(signatures, rows, extra_rows, max_bucket):
+    """
+    Bucket labels from the given signature rows.
+
+    Buckets bigger than max_bucket are split by further signature rows,
+    `len(rows)` at a time, from extra_rows. Keys still in oversized
+    buckets when those run out get label -1.
+    """
+    def labels_of(columns):
+        return pd.DataFrame(np.column_stack(columns)).groupby(list(range(len(columns))), sort=False) \
+            .ngroup().to_numpy(copy=True)
+
+    labels = labels_of([signatures[r] for r in rows])
+    for start in range(0, len(extra_rows) + 1, len(rows)):
+        counts = np.bincount(labels[labels >= 0])
+        big = (labels >= 0) & (counts[np.maximum(labels, 0)] > max_bucket)
+        if not big.any():
+            break
+        refine = extra_rows[start:start + len(rows)]
+        if not len(refine):
+            labels[big] = -1
+            break
+        labels[big] = labels.max() + 1 + labels_of([labels[big]] + [signatures[r][big] for r in refine])
+    return labels
+
+
+def similar_pairs(keys, threshold=0.8, n=2, bands=8, rows=4, max_bucket=100, seed=0):
+    """
+    Pairs of keys whose character n-gram sets have Jaccard similarity >= threshold.
+
+    Candidate pairs come from MinHash locality-sensitive hashing rather than
+    all-pairs comparison. Each key gets bands * rows MinHash values, and two
+    keys become candidates when all `rows` values of some band agree. A
+    pair with similarity s is a candidate with probability
+    1 - (1 - s**rows)**bands: 0.98 at s=0.8 and 0.87 at s=0.7 for the
+    defaults. Blocks bigger than max_bucket (runs of near-identical keys
+    such as numbered dishes) are split on extra MinHash values, so the
+    number of candidates stays about linear in the number of keys.
+    Candidates whose MinHash values mostly disagree are dropped (at 0.8 a
+    qualifying pair is lost this way with probability ~3e-5), and the rest
+    are checked exactly against their full gram sets. Keys are padded with
+    a space at each end, so word starts and ends count as grams. Keys
+    with different numbers in them (vintages, course numbers) are never
+    paired.
+
+    Returns two arrays of key positions (i < j) and the number of keys
+    that stayed in an oversized block in some band and were not compared
+    there.
+    """
+    padded = (' ' + pd.Series(keys, dtype=object) + ' ').to_numpy(dtype=str)
+    table = _gram_table(padded, n)
+    codes, grams = pd.factorize(table['gram'])
+    table = pd.DataFrame({'key': table['key'].to_numpy(), 'code': codes}).sort_values(['key', 'code'],
+                                                                                     ignore_index=True)
+    key = table['key'].to_numpy()
+    code = table['code'].to_numpy().astype(np.int64)
+    sizes = np.bincount(key, minlength=len(keys))
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+    banded = bands * rows
+    signatures = _minhash(code, offsets, banded + 4 * rows, seed)
+    candidates = []
+    unresolved = np.zeros(len(keys), dtype=bool)
+    for band in range(bands):
+        buckets = _band_buckets(signatures, np.arange(band * rows, (band + 1) * rows),
+                                np.arange(banded, len(signatures)), max_bucket)
+        unresolved |= buckets < 0
+        compared = np.flatnonzero(buckets >= 0)
+        a, b = _bucket_pairs(buckets[compared])
+        a, b = compared[a], compared[b]
+        # Sizes alone rule out a pair when the smaller set is too small
+        fits = np.minimum(sizes[a], sizes[b]) >= threshold * np.maximum(sizes[a], sizes[b])
+        a, b = a[fits], b[fits]
+        # The share of agreeing MinHash values estimates the similarity;
+        # pairs far below the threshold are dropped before the exact check
+        agree = np.empty(len(a))
+        for i in range(0, len(a), SIGNATURE_BATCH):
+            batch = slice(i, i + SIGNATURE_BATCH)
+            agree[batch] = (signatures[:banded, a[batch]] == signatures[:banded, b[batch]]).mean(axis=0)
+        keep = agree >= threshold - 0.3
+        candidates.append(a[keep] * len(keys) + b[keep])
+
+    pair_ids = np.sort(np.concatenate(candidates))
+    pair_ids = pair_ids[np.concatenate([[True], pair_ids[1:] != pair_ids[:-1]])] if len(pair_ids) else pair_ids
+    a, b = pair_ids // len(keys), pair_ids % len(keys)
+    numbers, _ = pd.factorize(pd.Series(keys, dtype=object).str.findall(r'\d+').str.join(' '))
+    a, b = a[numbers[a] == numbers[b]], b[numbers[a] == numbers[b]]
+
+    # Exact intersections: look up each of a's grams among b's (key, code) pairs
+    stride = len(grams) + 1
+    members = key.astype(np.int64) * stride + code
+    pair = np.repeat(np.arange(len(a)), sizes[a])
+    within = np.arange(len(pair)) - np.repeat(np.cumsum(sizes[a]) - sizes[a], sizes[a])
+    a_grams = code[offsets[a][pair] + within]
+    lookup = b[pair].astype(np.int64) * stride + a_grams
+    found = members[np.minimum(np.searchsorted(members, lookup), len(members) - 1)] == lookup
+    shared = np.bincount(pair[found], minlength=len(a))
+    similar = shared >= threshold * (sizes[a] + sizes[b] - shared)
+    order = np.lexsort((b[similar], a[similar]))
+    return a[similar][order], b[similar][order], int(unresolved.sum())
+
+
+def _components(n, edges):
+    """Connected-component labels (the smallest member) of n nodes, by label propagation."""
+    labels = np.arange(n)
+    if not edges:
+        return labels
+    a = np.concatenate([e[0] for e in edges]).astype(np.int64)
+    b = np.concatenate([e[1] for e in edges]).astype(np.int64)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        # Pointer jumping: follow labels to their own labels
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def _group_edges(codes):
+    """Edges joining every member of a code group to the group's first member."""
+    codes = np.asarray(codes)
+    valid = codes >= 0
+    order = np.flatnonzero(valid)[np.argsort(codes[valid], kind='stable')]
+    first = np.concatenate([[True], codes[order][1:] != codes[order][:-1]]) if len(order) else order
+    heads = order[first][np.cumsum(first) - 1] if len(order) else order
+    return heads, order
+
+
+def _attach_to_centers(labels, rank_of_label, pairs):
+    """
+    Merge near-duplicate groups into center groups, one link deep.
+
+    pairs are (group, group) labels whose canonical keys are near-
+    duplicates. A group with no stronger neighbour (lower rank) is a
+    center. Every other group joins the strongest center it is paired
+    with directly, or stays on its own if none is. Links are never
+    followed transitively, so "Peas With Bacon" -> "Peaches With Bacon"
+    -> ... can't chain unrelated dishes together.
+    """
+    ga, gb = pairs
+    stronger = rank_of_label[ga] < rank_of_label[gb]
+    strong, weak = np.where(stronger, ga, gb), np.where(stronger, gb, ga)
+    is_weak = np.zeros(len(labels), dtype=bool)
+    is_weak[weak] = True
+    to_center = ~is_weak[strong]
+    unset = np.iinfo(np.int64).max
+    best = np.full(len(labels), unset)
+    np.minimum.at(best, weak[to_center], rank_of_label[strong[to_center]])
+    target = np.arange(len(labels))
+    merged = best < unset
+    target[merged] = best[merged]
+    return target, merged
+
+
+def cluster_dishes(dish_df, threshold=1.0, ngram=None, verbose=True):
+    """
+    Map every dish to a canonical dish.
+
+    Dishes whose fingerprint keys or squashed keys match form one group.
+    With `ngram`, dishes whose `ngram`-gram fingerprints and the numbers in
+    their names match are grouped too; those sets ignore character order,
+    so this is opt-in.
+
+    Near-duplicate fingerprint keys (similar_pairs at `threshold`; 1.0
+    turns this stage off) then merge groups by center linkage: each group
+    joins a center group whose canonical key is itself a near-duplicate
+    of the group's own canonical key (see _attach_to_centers). A cluster's
+    canonical dish is the member with the highest times_appeared, with
+    ties going to the lowest id. Returns a DataFrame of dish_id,
+    canonical_id.
+    """
+    names = dish_df['name']
+    timings = {}
+
+    start = time.perf_counter()
+    keys = fingerprint(names)
+    key_codes, unique_keys = pd.factorize(keys.where(keys != ''))
+    timings['fingerprint'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    squashed = squashed_key(names)
+    squashed_codes, _ = pd.factorize(squashed.where(squashed != ''))
+    edges = [_group_edges(key_codes), _group_edges(squashed_codes)]
+    timings['squashed key'] = time.perf_counter() - start
+
+    if ngram:
+        start = time.perf_counter()
+        ngram_keys = ngram_fingerprint(names, ngram)
+        # n-gram sets ignore order, so "No. 12" and "No. 21" would collide; keep numbers apart
+        numbers = names.astype(object).where(names.notna(), '').astype(str).str.findall(r'\d+').str.join(' ')
+        ngram_codes, _ = pd.factorize((ngram_keys + '|' + numbers).where(ngram_keys != ''))
+        edges.append(_group_edges(ngram_codes))
+        timings['n-gram fingerprint'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels = _components(len(dish_df), edges)
+    ids = dish_df['id'].to_numpy(dtype=np.int64)
+    times = dish_df['times_appeared'].to_numpy(dtype=np.int64)
+    # Dishes by strength: highest times_appeared, then lowest id. A group's
+    # rank is its best member's, and that member is its canonical dish.
+    by_strength = np.lexsort((ids, -times))
+    rank = np.empty(len(ids), dtype=np.int64)
+    rank[by_strength] = np.arange(len(ids))
+    rank_of_label = np.full(len(ids), len(ids), dtype=np.int64)
+    np.minimum.at(rank_of_label, labels, rank)
+    timings['key groups'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if threshold < 1 and len(unique_keys):
+        key_a, key_b, unresolved = similar_pairs(unique_keys, threshold)
+        # Only groups' canonical keys take part; a key belongs to one group
+        groups = np.unique(labels)
+        canonical_keys = key_codes[by_strength[rank_of_label[groups]]]
+        group_of_key = np.full(len(unique_keys), -1, dtype=np.int64)
+        group_of_key[canonical_keys[canonical_keys >= 0]] = groups[canonical_keys >= 0]
+        ga, gb = group_of_key[key_a], group_of_key[key_b]
+        linked = (ga >= 0) & (gb >= 0)
+        target, merged = _attach_to_centers(labels, rank_of_label, (ga[linked], gb[linked]))
+        # Centers are named by their rank; map back to the center's label
+        target[merged] = labels[by_strength[target[merged]]]
+        labels = target[labels]
+        timings[f'near-duplicate keys ({len(key_a):,} pairs)'] = time.perf_counter() - start
+        if unresolved and verbose:
+            print(f"  {unresolved:,} keys sat in oversized blocks and were only partly compared")
+
+    start = time.perf_counter()
+    # Best member per cluster: highest times_appeared, then lowest id
+    order = np.lexsort((ids, -times, labels))
+    first = np.concatenate([[True], labels[order][1:] != labels[order][:-1]])
+    canonical_of_label = pd.Series(ids[order][first], index=labels[order][first])
+    canonical = canonical_of_label.reindex(labels).to_numpy()
+    timings['canonical dishes'] = time.perf_counter() - start
+
+    if verbose:
+        for stage, seconds in timings.items():
+            print(f"  {stage:<36} {seconds:6.2f}s")
+    return pd.DataFrame({'dish_id': ids, 'canonical_id': canonical})
+
+
+def load_mapping(path=CLUSTERS_PATH):
+    """dish_id -> canonical_id Series from a clusters file."""
+    mapping = pd.read_csv(path)
+    return mapping.set_index('dish_id')['canonical_id']
+
+
+def canonical_ids(dish_ids, mapping):
+    """Replace dish ids with their canonical ids; unmapped and missing ids are kept."""
+    mapped = mapping.reindex(dish_ids.to_numpy(dtype=np.float64, na_value=np.nan)).to_numpy(dtype=np.float64)
+    original = dish_ids.to_numpy(dtype=np.float64, na_value=np.nan)
+    return pd.Series(np.where(np.isnan(mapped), original, mapped), index=dish_ids.index).astype(dish_ids.dtype)
+
+
+def canonical_dishes(dish_df, mapping):
+    """
+    Dish table with one row per canonical dish.
+
+    Each row keeps the canonical dish's id and name, and sums
+    times_appeared and menus_appeared over the cluster. menus_appeared can
+    overcount menus that list two variants of the same dish.
+    """
+    canonical = canonical_ids(dish_df['id'], mapping)
+    totals = dish_df.groupby(canonical.to_numpy())[['times_appeared', 'menus_appeared']].sum()
+    dishes = dish_df[dish_df['id'].isin(totals.index)].set_index('id')
+    dishes[['times_appeared', 'menus_appeared']] = totals.reindex(dishes.index).to_numpy()
+    return dishes.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cluster dish name variants and write a dish_id -> canonical_id map")
+    parser.add_argument('--threshold', type=float, default=1.0,
+                        help="n-gram Jaccard similarity for near-duplicate keys (1.0 = key collision only)")
+    parser.add_argument('--ngram', type=int,
+                        help="also merge dishes whose character n-gram sets collide (e.g. 2; looser, off by default)")
+    parser.add_argument('--output', default=CLUSTERS_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    dish_df = load_source('Dish')
+    print(f"Clustering {len(dish_df):,} dish names")
+    mapping = cluster_dishes(dish_df, args.threshold, args.ngram)
+    mapping.to_csv(args.output, index=False)
+    elapsed = time.perf_counter() - start
+
+    merged = mapping[mapping['dish_id'] != mapping['canonical_id']]
+    print(f"{mapping['canonical_id'].nunique():,} canonical dishes; {len(merged):,} dishes merged "
+          f"into {merged['canonical_id'].nunique():,} clusters in {elapsed:.1f}s -> {args.output}")
+
+    names = dish_df.set_index('id')['name'].astype(object)
+    sizes = mapping.groupby('canonical_id').size().sort_values(ascending=False, kind='stable')
+    print("Largest clusters:")
+    for canonical_id, size in sizes.head(10).items():
+        members = mapping.loc[mapping['canonical_id'] == canonical_id, 'dish_id']
+        variants = ', '.join(names.reindex(members).astype(str).head(5))
+        print(f"   {names.get(canonical_id)!s:<25} {size:>5} ids  ({variants}{', ...' if size > 5 else ''})")
@@ -0,0 +1,189 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from decade_stats import grouped_quantile, print_rankings
+from streaming_join import avg_prices, iter_menu_items, join_menus, menu_lookup, page_lookup
+from table_schemas import SOURCE_FILES, load_source
+
+CUBE_PATH = 'dish_cube.npz'
+
+
+def _encode_strings(strings):
+    encoded = [str(s).encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_strings(data, offsets):
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def build_cube(path=CUBE_PATH, menuitem_path=SOURCE_FILES['MenuItem'], chunksize=200_000):
+    """
+    Scan the joined MenuItem/MenuPage/Menu data once and save the cube.
+
+    The cube is keyed by (dish_id, year) and holds item counts plus a
+    value-count table of avg_price per (dish_id, year). Menu prices come
+    in few distinct values, so this table stays small, and exact medians
+    and quantiles can be read from it.
+    """
+    start = time.perf_counter()
+    menus = menu_lookup(load_source('Menu'))
+    page_menu = page_lookup(load_source('MenuPage'))
+    dish_df = load_source('Dish')
+    dish_index = pd.Index(dish_df['id'])
+
+    count_parts, price_parts = [], []
+    for chunk in iter_menu_items(menuitem_path, chunksize):
+        chunk = chunk[chunk['dish_id'].isin(dish_index)]
+        chunk, menu = join_menus(chunk, page_menu, menus)
+        keys = pd.DataFrame({
+            'dish_id': chunk['dish_id'].to_numpy(dtype=np.int64),
+            'year': menu['year'].to_numpy(),
+            'price': avg_prices(chunk['price'], chunk['high_price']),
+        })
+        count_parts.append(keys.groupby(['dish_id', 'year']).size())
+        price_parts.append(keys.dropna(subset=['price']).groupby(['dish_id', 'year', 'price']).size())
+
+    counts = pd.concat(count_parts).groupby(level=[0, 1]).sum().rename('n').reset_index()
+    counts = counts.sort_values(['year', 'dish_id'], ignore_index=True)
+    prices = pd.concat(price_parts).groupby(level=[0, 1, 2]).sum().rename('n').reset_index()
+
+    names = dish_df.set_index('id')['name'].reindex(np.unique(counts['dish_id'].to_numpy()))
+    name_data, name_offsets = _encode_strings(names.astype(object).fillna('').to_numpy())
+
+    np.savez(path,
+             count_dish=counts['dish_id'].to_numpy(dtype=np.int32),
+             count_year=counts['year'].to_numpy(dtype=np.int16),
+             count_n=counts['n'].to_numpy(dtype=np.int64),
+             price_dish=prices['dish_id'].to_numpy(dtype=np.int32),
+             price_year=prices['year'].to_numpy(dtype=np.int16),
+             price_value=prices['price'].to_numpy(dtype=np.float64),
+             price_n=prices['n'].to_numpy(dtype=np.int64),
+             name_ids=names.index.to_numpy(dtype=np.int32),
+             name_data=name_data,
+             name_offsets=name_offsets)
+    print(f"Built {path}: {len(counts):,} (dish, year) cells, {len(prices):,} price cells "
+          f"in {time.perf_counter() - start:.1f}s")
+    return DishCube.load(path)
+
+
+class DishCube:
+    """Query API over a cube written by build_cube()."""
+
+    def __init__(self, counts, prices, names):
+        self.counts = counts
+        self.prices = prices
+        self.names = names
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        with np.load(path) as f:
+            counts = pd.DataFrame({'dish_id': f['count_dish'], 'year': f['count_year'], 'n': f['count_n']})
+            prices = pd.DataFrame({'dish_id': f['price_dish'], 'year': f['price_year'],
+                                   'price': f['price_value'], 'n': f['price_n']})
+            names = pd.Series(_decode_strings(f['name_data'], f['name_offsets']), index=f['name_ids'])
+        return cls(counts, prices, names)
+
+    def dish_ids(self, dishes):
+        """Resolve ids or names (case-insensitive, exact) to a list of dish ids."""
+        if isinstance(dishes, (int, np.integer, str)):
+            dishes = [dishes]
+        ids = []
+        lowered = None
+        for dish in dishes:
+            if isinstance(dish, str):
+                if lowered is None:
+                    lowered = self.names.str.strip().str.lower()
+                ids.extend(lowered.index[lowered == dish.strip().lower()])
+            else:
+                ids.append(int(dish))
+        return ids
+
+    def _select(self, table, start, end, dishes):
+        year = table['year'].to_numpy()
+        mask = (year >= start) & (year <= end)
+        if dishes is not None:
+            mask &= np.isin(table['dish_id'].to_numpy(), self.dish_ids(dishes))
+        return table[mask]
+
+    def top_n(self, n=5, start=1850, end=2020, width=10, dishes=None):
+        """
+        Top-n dishes per `width`-year bucket within [start, end].
+
+        If `dishes` is given, ranking and bucket totals cover only those
+        dishes. This reproduces the analysis over a fixed dish set.
+        """
+        counts = self._select(self.counts, start, end, dishes)
+        buckets = counts['year'].astype(np.int64) // width * width
+        stats = counts['n'].groupby([buckets.rename('bucket'), counts['dish_id']]).sum() \
+            .rename('frequency').reset_index()
+        stats['bucket_total'] = stats['bucket'].map(stats.groupby('bucket')['frequency'].sum()).to_numpy()
+        stats['share'] = stats['frequency'] / stats['bucket_total']
+        stats['dish_name'] = self.names.reindex(stats['dish_id']).to_numpy()
+
+        stats = stats.sort_values(['bucket', 'frequency', 'dish_name'], ascending=[True, False, True],
+                                  kind='stable', ignore_index=True)
+        stats['rank'] = stats.groupby('bucket', sort=False).cumcount() + 1
+        stats = stats[stats['rank'] <= n].reset_index(drop=True)
+
+        prices = self._select(self.prices, start, end, stats['dish_id'].unique())
+        prices = prices.assign(bucket=prices['year'].astype(np.int64) // width * width)
+        prices = prices.merge(stats[['bucket', 'dish_id']], on=['bucket', 'dish_id'])
+        medians = grouped_quantile(prices, ['bucket', 'dish_id'], 0.5) if len(prices) \
+            else pd.Series(dtype=np.float64)
+        stats['median_price'] = medians.reindex(pd.MultiIndex.from_frame(stats[['bucket', 'dish_id']])).to_numpy()
+
+        return stats[['bucket', 'rank', 'dish_id', 'dish_name', 'frequency', 'share', 'median_price', 'bucket_total']]
+
+    def quantiles(self, dishes, qs=(0.5,), start=1850, end=2020):
+        """Exact price quantiles over all items of `dishes` within [start, end]."""
+        prices = self._select(self.prices, start, end, dishes)
+        if prices.empty:
+            return {q: np.nan for q in qs}
+        prices = prices.groupby('price', as_index=False)['n'].sum().assign(group=0)
+        return {q: float(grouped_quantile(prices, ['group'], q).iloc[0]) for q in qs}
+
+    def median_price(self, dishes, start=1850, end=2020):
+        return self.quantiles(dishes, (0.5,), start, end)[0.5]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precomputed dish x year aggregate cube")
+    parser.add_argument('--cube', default=CUBE_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('build', help="scan the source tables and write the cube")
+    top = commands.add_parser('top', help="top-N dishes per bucket")
+    top.add_argument('--n', type=int, default=5)
+    top.add_argument('--start', type=int, default=1850)
+    top.add_argument('--end', type=int, default=2020)
+    top.add_argument('--width', type=int, default=10, help="bucket width in years (10 = decades)")
+    price = commands.add_parser('price', help="price quantiles for a dish")
+    price.add_argument('dish', nargs='+', help="dish names or ids")
+    price.add_argument('--start', type=int, default=1850)
+    price.add_argument('--end', type=int, default=2020)
+    price.add_argument('--q', type=float, nargs='+', default=[0.5])
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_cube(args.cube)
+    else:
+        cube = DishCube.load(args.cube)
+        start = time.perf_counter()
+        if args.command == 'top':
+            result = cube.top_n(args.n, args.start, args.end, args.width)
+            elapsed = time.perf_counter() - start
+            print_rankings(result, 'bucket')
+        else:
+            dishes = [int(d) if d.isdigit() else d for d in args.dish]
+            result = cube.quantiles(dishes, args.q, args.start, args.end)
+            elapsed = time.perf_counter() - start
+            for q, value in result.items():
+                print(f"p{100 * q:g} {' '.join(args.dish)} {args.start}-{args.end}: "
+                      + (f"${value:.2f}" if pd.notna(value) else "No price"))
+        print(f"\nAnswered in {1000 * elapsed:.1f} ms")
@@ -0,0 +1,143 @@
+import argparse
+import time
+import weakref
+
+import pandas as pd
+
+from sqlite_store import DB_PATH, explain, open_store
+
+# The dish set is a parameter, not part of the SQL: its ids sit in a temp
+# table with an INTEGER PRIMARY KEY, so the statement text and its plan
+# are the same for 5 ids or 100K. year, decade and avg_price are stored
+# columns (see streaming_join.add_date_columns and
+# sqlite_store.GENERATED_COLUMNS), so the year filter is a plain integer range.
+DISH_SET_TABLE = 'temp.selected_dish'
+DETAILED_QUERY = f"""
+    SELECT
+        d.id as dish_id,
+        d.name as dish_name,
+        mi.price,
+        mi.high_price,
+        mi.avg_price,
+        m.date,
+        m.year,
+        m.decade,
+        m.location,
+        m.venue
+    FROM MenuItem mi
+    JOIN MenuPage mp ON mi.menu_page_id = mp.id
+    JOIN Menu m ON mp.menu_id = m.id
+    JOIN Dish d ON mi.dish_id = d.id
+    WHERE mi.dish_id IN (SELECT id FROM {DISH_SET_TABLE})
+        AND m.year BETWEEN 1850 AND 2020
+    ORDER BY d.times_appeared DESC, m.date, mi.id
+    """
+# A chunk whose prices are all NULL would otherwise come back as object
+DETAILED_DTYPES = {'price': 'float64', 'high_price': 'float64', 'avg_price': 'float64'}
+
+# id(connection) -> weak reference to the cursor of its running extraction.
+# Temp tables are per connection, so one dish-set table per connection is
+# enough. A live cursor keeps its connection alive, so its id can't be reused.
+_running = {}
+
+
+def _running_cursor(conn):
+    ref = _running.get(id(conn))
+    cursor = ref() if ref is not None else None
+    return cursor if cursor is not None and cursor.connection is conn else None
+
+
+def load_dish_set(conn, dish_ids):
+    """Replace the connection's dish set with dish_ids (any iterable of ints). Returns its size."""
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {DISH_SET_TABLE} (id INTEGER PRIMARY KEY)')
+    conn.execute(f'DELETE FROM {DISH_SET_TABLE}')
+    conn.executemany(f'INSERT OR IGNORE INTO {DISH_SET_TABLE} VALUES (?)', ((int(i),) for i in dish_ids))
+    return conn.execute(f'SELECT COUNT(*) FROM {DISH_SET_TABLE}').fetchone()[0]
+
+
+def iter_detailed(conn, dish_ids, chunksize=50_000):
+    """
+    The detailed query's rows for any number of dish ids, in DataFrame
+    chunks of up to chunksize rows and in the query's order.
+
+    Works on a read-only connection too: temp tables live in SQLite's
+    temp database. The query's cursor is closed and the dish set emptied
+    once the rows are consumed or the generator is closed. Starting
+    another extraction on the same connection ends one abandoned partway:
+    its cursor is closed so the dish set can be refilled.
+    """
+    abandoned = _running_cursor(conn)
+    if abandoned is not None:
+        abandoned.close()
+    load_dish_set(conn, dish_ids)
+    cursor = conn.execute(DETAILED_QUERY)
+    _running[id(conn)] = weakref.ref(cursor)
+    try:
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchmany(chunksize)
+        yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True).astype(DETAILED_DTYPES)
+        while rows := cursor.fetchmany(chunksize):
+            yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True).astype(DETAILED_DTYPES)
+    finally:
+        cursor.close()
+        # A later extraction may own the dish set by now; leave its ids alone
+        if _running_cursor(conn) is cursor:
+            del _running[id(conn)]
+            conn.execute(f'DELETE FROM {DISH_SET_TABLE}')
+
+
+def extract_detailed(conn, dish_ids, output_path, chunksize=50_000):
+    """
+    Write the detailed rows for dish_ids to output_path as they arrive.
+
+    The CSV is byte-identical to writing the whole result at once.
+    Returns all rows as one DataFrame for the decade aggregation.
+    """
+    parts = []
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in iter_detailed(conn, dish_ids, chunksize):
+            chunk.to_csv(f, header=not parts, index=False)
+            parts.append(chunk)
+    return pd.concat(parts, ignore_index=True)
+
+
+def benchmark(conn, sizes=(5, 1_000, 100_000), chunksize=50_000):
+    """
+    Time extraction for the `size` most frequent dishes, for each size.
+
+    Reports the time to load the dish set, the time to the first chunk
+    (the query's sort has to finish before it arrives) and the total time
+    to consume every row, then the query plan for each size.
+    """
+    ranked = [row[0] for row in conn.execute('SELECT id FROM Dish ORDER BY times_appeared DESC, id')]
+    plans = {}
+    print(f"{'Dish ids':>9} {'Rows':>11} {'Load ms':>9} {'First chunk s':>14} {'Total s':>9} {'Rows/s':>11}")
+    print("-" * 68)
+    for size in sizes:
+        ids = ranked[:size]
+        start = time.perf_counter()
+        load_dish_set(conn, ids)
+        load_ms = 1000 * (time.perf_counter() - start)
+        plans.setdefault(explain(conn, DETAILED_QUERY), []).append(len(ids))
+
+        start = time.perf_counter()
+        first = None
+        rows = 0
+        for chunk in iter_detailed(conn, ids, chunksize):
+            if first is None:
+                first = time.perf_counter() - start
+            rows += len(chunk)
+        total = time.perf_counter() - start
+        print(f"{len(ids):>9,} {rows:>11,} {load_ms:>9.1f} {first or 0:>14.2f} {total:>9.2f} {rows / total:>11,.0f}")
+
+    for plan, plan_sizes in plans.items():
+        print(f"\nPlan for {', '.join(f'{size:,}' for size in plan_sizes)} dish ids:\n{plan}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dish-set extraction for growing numbers of dish ids")
+    parser.add_argument('--db', default=DB_PATH, help=f"store built by sqlite_store.py (default {DB_PATH})")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 1_000, 100_000])
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    args = parser.parse_args()
+    benchmark(open_store(args.db), args.sizes, args.chunksize)
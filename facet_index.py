@@ -0,0 +1,199 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Scanning a row's dictionary code costs about as much as this many
+# posting-list entries; select() uses it to choose a plan per query
+SCAN_COST = 0.25
+# Per matching dictionary value, the fixed cost of slicing its posting list
+VALUE_COST = 200
+
+
+def encode(values):
+    """Dictionary-encode values: (int32 codes, sorted distinct values); nulls get code -1."""
+    values = pd.Categorical(values)
+    return values.codes.astype(np.int32), values.categories
+
+
+class PostingIndex:
+    """
+    Sorted row ids for each dictionary code of one column.
+
+    Stored CSR-style: the ids for code c are rows[offsets[c]:offsets[c + 1]],
+    in ascending order. Rows with a null value (code -1) are not indexed.
+    """
+
+    def __init__(self, codes, n_values):
+        order = np.argsort(codes, kind='stable').astype(np.int32)
+        n_null = int((codes < 0).sum())
+        self.rows = order[n_null:]
+        self.offsets = np.zeros(n_values + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes[codes >= 0], minlength=n_values), out=self.offsets[1:])
+
+    def postings(self, code, lo, hi):
+        """Row ids with `code` in the row range [lo, hi)."""
+        ids = self.rows[self.offsets[code]:self.offsets[code + 1]]
+        start, end = np.searchsorted(ids, (lo, hi))
+        return ids[start:end]
+
+    def size(self, codes):
+        return int((self.offsets[codes + 1] - self.offsets[codes]).sum())
+
+
+class FacetIndex:
+    """
+    Dictionary-encoded facet columns over a fact table sorted by year.
+
+    Because rows are sorted by year, a year range is a contiguous row range
+    found by binary search. Each facet column stores its codes (the forward
+    index) and a PostingIndex (the inverted index). select() answers any
+    combination of year range and facet filters. It starts from the most
+    selective facet's posting lists, then checks the other facets against
+    their codes for only those rows. When a filter matches too many values
+    or rows for postings to pay off, it scans the codes of the year range.
+    """
+
+    def __init__(self, year, facets):
+        if np.any(np.diff(year) < 0):
+            raise ValueError("rows must be sorted by year")
+        self.year = year
+        self.codes = {}
+        self.values = {}
+        self.postings = {}
+        for name, (codes, values) in facets.items():
+            self.codes[name] = codes
+            self.values[name] = values
+            self.postings[name] = PostingIndex(codes, len(values))
+
+    def __len__(self):
+        return len(self.year)
+
+    def year_range(self, start, end):
+        """Row range [lo, hi) of the rows dated start..end inclusive."""
+        # Bounds in the column's own dtype, so the search doesn't copy the column to convert it
+        limits = np.iinfo(self.year.dtype)
+        bounds = np.clip([start, end + 1], limits.min, limits.max).astype(self.year.dtype)
+        lo, hi = np.searchsorted(self.year, bounds)
+        return int(lo), int(hi)
+
+    def matching_codes(self, name, patterns):
+        """Codes of the facet values containing any of patterns, case-insensitively."""
+        lowered = self.values[name].astype(str).str.lower()
+        matching = np.zeros(len(lowered), dtype=bool)
+        for pattern in patterns:
+            matching |= np.asarray(lowered.str.contains(pattern.lower(), regex=False))
+        return np.flatnonzero(matching)
+
+    def select(self, start, end, filters=None):
+        """
+        Row ids dated start..end whose facets match all filters.
+
+        filters maps a facet name to the codes it may take. Returns an int
+        array of row ids in no particular order.
+        """
+        lo, hi = self.year_range(start, end)
+        filters = {name: np.asarray(codes, dtype=np.int64) for name, codes in (filters or {}).items()}
+        if not filters:
+            return np.arange(lo, hi)
+        if any(len(codes) == 0 for codes in filters.values()) or lo == hi:
+            return np.empty(0, dtype=np.int64)
+
+        # Drive from the facet with the fewest candidate rows (whole-table posting
+        # sizes are an upper bound for the year range)
+        name = min(filters, key=lambda f: self.postings[f].size(filters[f]))
+        codes = filters.pop(name)
+        driver_cost = self.postings[name].size(codes) + VALUE_COST * len(codes)
+        if driver_cost < SCAN_COST * (hi - lo):
+            index = self.postings[name]
+            parts = [index.postings(code, lo, hi) for code in codes]
+            rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+        else:
+            filters[name] = codes
+            rows = np.arange(lo, hi)
+
+        for name, codes in filters.items():
+            matching = np.zeros(len(self.values[name]) + 1, dtype=bool)
+            matching[codes + 1] = True
+            # Shift by one so null (-1) lands on the always-False slot 0
+            rows = rows[matching[self.codes[name][rows] + 1]]
+        return rows
+
+    def breakdown(self, name, rows):
+        """Row counts per value of facet `name` among rows, largest first; nulls excluded."""
+        codes = self.codes[name][rows]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.values[name]))
+        present = np.flatnonzero(counts)
+        return pd.Series(counts[present], index=self.values[name][present], name='rows') \
+            .sort_values(ascending=False, kind='stable')
+
+
+def scan_select(index, start, end, filters):
+    """select() by scanning every row: the reference and baseline for benchmark()."""
+    mask = (index.year >= start) & (index.year <= end)
+    for name, codes in filters.items():
+        mask &= np.isin(index.codes[name], codes)
+    return np.flatnonzero(mask)
+
+
+def benchmark(store, repeat=5):
+    """
+    Time typical facet selections on a query_service.FactStore, indexed
+    against a full scan, and the top-5 ranking of the selected rows.
+    Raises AssertionError if the index and the scan disagree.
+    """
+    index = store.snapshot()[0]
+    everything = np.arange(len(index))
+    venues = index.breakdown('venue', everything).index
+    locations = index.breakdown('location', everything).index
+
+    def codes(name, value):
+        return [index.values[name].get_loc(value)]
+
+    top_dishes = index.values['dish'].get_indexer(list(store.top_dish_ids(5)))
+    cases = [
+        ('1930s', 1930, 1939, {}),
+        (f"venue={venues[0]}", 1850, 2020, {'venue': codes('venue', venues[0])}),
+        (f"venue={venues[-1]}, 1900-1919", 1900, 1919, {'venue': codes('venue', venues[-1])}),
+        (f"location={locations[0]}, venue={venues[0]}", 1850, 2020,
+         {'location': codes('location', locations[0]), 'venue': codes('venue', venues[0])}),
+        (f"location={locations[len(locations) // 2]}, 1880s", 1880, 1889,
+         {'location': codes('location', locations[len(locations) // 2])}),
+        ('top 5 dishes, 1880s', 1880, 1889, {'dish': top_dishes}),
+        (f"top 5 dishes, venue={venues[0]}", 1850, 2020, {'dish': top_dishes, 'venue': codes('venue', venues[0])}),
+    ]
+
+    def best_of(select):
+        best = float('inf')
+        for _ in range(repeat):
+            t = time.perf_counter()
+            result = select()
+            best = min(best, time.perf_counter() - t)
+        return 1000 * best, result
+
+    print(f"{'Selection':<50} {'Rows':>9} {'Index ms':>9} {'Scan ms':>8} {'Top-5 ms':>9}")
+    print("-" * 89)
+    for label, start, end, filters in cases:
+        index_ms, rows = best_of(lambda: index.select(start, end, filters))
+        scan_ms, expected = best_of(lambda: scan_select(index, start, end, filters))
+        if not np.array_equal(np.sort(rows), expected):
+            raise AssertionError(f"index and scan disagree for {label}")
+        rank_ms, _ = best_of(lambda: store.rank_rows(rows)[0])
+        print(f"{label[:50]:<50} {len(rows):>9,} {index_ms:>9.2f} {scan_ms:>8.2f} {rank_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    from query_service import FactStore
+    import incremental
+
+    parser = argparse.ArgumentParser(description="Benchmark facet selections (venue, location, dish, year) "
+                                                 "through the index against a full scan")
+    parser.add_argument('--state', default=incremental.STATE_DIR,
+                        help=f"incremental state directory (default {incremental.STATE_DIR})")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    store = FactStore(args.state)
+    print(f"Indexed {len(store.snapshot()[0]):,} joined menu items in {store.load_seconds:.1f}s\n")
+    benchmark(store, args.repeat)
@@ -0,0 +1,433 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from catalog_topn import rank_buckets
+from decade_stats import print_rankings
+from data_cache import read_frame, write_frame
+from dish_clusters import canonical_dishes, canonical_ids, load_mapping
+from parallel_csv import _header_end
+from streaming_join import avg_prices, menu_years, sort_detailed, write_detailed
+from table_schemas import SOURCE_FILES, apply_schema, load_source, read_options
+
+STATE_DIR = '.incremental'
+STATE = 'state.json'
+# Tables whose appended rows are ingested. Dish is a small name/count
+# lookup that is read whole through the columnar cache on every run.
+TRACKED = ('Menu', 'MenuPage', 'MenuItem')
+# Fact parts are merged into one once there are more than this many
+MAX_FACT_PARTS = 16
+MIN_YEAR, MAX_YEAR = 1850, 2020
+
+
+def _complete_rows(data):
+    """
+    Length of the longest prefix of `data` that ends on a row boundary.
+
+    A row that is still being written (no newline yet, or a newline inside
+    an open quote) is left for the next run. Walks back from the end, so
+    normally only the last line is inspected.
+    """
+    parity = data.count(b'"') & 1
+    end = len(data)
+    while end > 0:
+        newline = data.rfind(b'\n', 0, end)
+        if newline < 0:
+            return 0
+        parity ^= data.count(b'"', newline + 1, end) & 1
+        if not parity:
+            return newline + 1
+        end = newline
+    return 0
+
+
+def _hash_prefix(f, length, block_size=1 << 20):
+    digest = hashlib.sha256()
+    f.seek(0)
+    while length > 0:
+        block = f.read(min(block_size, length))
+        if not block:
+            break
+        digest.update(block)
+        length -= len(block)
+    return digest
+
+
+def _no_rows(table):
+    return apply_schema(pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype
+                                      in read_options(table)['dtype'].items()}), table)
+
+
+def scan_table(table, path, mark=None):
+    """
+    Parse the rows appended to a source CSV since its high-water mark.
+
+    A mark records the byte offset just past the last ingested row, a
+    SHA-256 of every byte before it, the largest id seen and the file's
+    size and mtime. With no mark the whole file is read. Returns
+    (rows, new_mark), or (None, None) if the file was changed other than
+    by appending: it shrank, its ingested prefix differs, or the new rows
+    reuse ids at or below the old maximum.
+    """
+    stat = os.stat(path)
+    if mark is not None and (stat.st_size, stat.st_mtime_ns) == (mark['size'], mark['mtime_ns']):
+        return _no_rows(table), mark
+
+    with open(path, 'rb') as f:
+        if mark is None:
+            start = _header_end(f)
+            digest = _hash_prefix(f, start)
+            f.seek(0)
+            columns = list(pd.read_csv(io.BytesIO(f.read(start)), nrows=0).columns)
+            max_id = None
+        else:
+            start, columns, max_id = mark['offset'], mark['columns'], mark['max_id']
+            if stat.st_size < start:
+                return None, None
+            digest = _hash_prefix(f, start)
+            if digest.hexdigest() != mark['sha256']:
+                return None, None
+        f.seek(start)
+        data = f.read()
+    data = data[:_complete_rows(data)]
+
+    if not data:
+        rows = _no_rows(table)
+    else:
+        rows = apply_schema(pd.read_csv(io.BytesIO(data), header=None, names=columns, **read_options(table)),
+                            table)
+    if len(rows):
+        if max_id is not None and rows['id'].min() <= max_id:
+            return None, None
+        max_id = int(rows['id'].max())
+
+    digest.update(data)
+    return rows, {
+        'offset': start + len(data),
+        'sha256': digest.hexdigest(),
+        'max_id': max_id,
+        'columns': columns,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+
+
+def _menu_part(menu_rows):
+    return pd.DataFrame({
+        'id': menu_rows['id'].to_numpy(dtype=np.int64),
+        'date': menu_rows['date'].to_numpy(dtype=object),
+        'year': menu_years(menu_rows['date']).to_numpy(dtype=np.float64),
+        'location': menu_rows['location'].to_numpy(dtype=object),
+        'venue': menu_rows['venue'].to_numpy(dtype=object),
+    })
+
+
+def _page_part(page_rows):
+    return pd.DataFrame({
+        'id': page_rows['id'].to_numpy(dtype=np.int64),
+        'menu_id': page_rows['menu_id'].astype('float64').to_numpy(),
+    })
+
+
+def join_items(items, pages, menus):
+    """
+    Join MenuItem rows to their menu's date, year, decade and venue.
+
+    Returns (fact, waiting). fact holds the rows whose menu is dated
+    MIN_YEAR-MAX_YEAR. waiting holds the rows whose page, or whose page's
+    menu, has not been seen yet; a later append may still complete them.
+    All other rows can never join and are dropped.
+    """
+    page_pos = pd.Index(pages['id']).get_indexer(items['menu_page_id'])
+    menu_ids = pages['menu_id'].to_numpy()[np.maximum(page_pos, 0)]
+    menu_pos = pd.Index(menus['id']).get_indexer(menu_ids)
+    years = menus['year'].to_numpy()[np.maximum(menu_pos, 0)]
+
+    waiting = (page_pos < 0) | (~np.isnan(menu_ids) & (menu_pos < 0))
+    joined = ~waiting & (menu_pos >= 0) & (years >= MIN_YEAR) & (years <= MAX_YEAR)
+
+    rows, menu = items[joined], menus.iloc[menu_pos[joined]]
+    year = menu['year'].to_numpy(dtype=np.int64)
+    fact = pd.DataFrame({
+        'item_id': rows['id'].to_numpy(dtype=np.int64),
+        'dish_id': rows['dish_id'].to_numpy(dtype=np.int64),
+        'price': rows['price'].to_numpy(dtype=np.float64),
+        'high_price': rows['high_price'].to_numpy(dtype=np.float64),
+        'avg_price': avg_prices(rows['price'], rows['high_price']),
+        'date': menu['date'].to_numpy(dtype=object),
+        'year': year,
+        'decade': year // 10 * 10,
+        'location': menu['location'].to_numpy(dtype=object),
+        'venue': menu['venue'].to_numpy(dtype=object),
+    })
+    return fact, items[waiting]
+
+
+def aggregate(fact):
+    """Per-decade (decade, dish_id) counts and (decade, dish_id, price) avg_price value counts."""
+    counts = fact.groupby(['decade', 'dish_id']).size().rename('n').reset_index()
+    priced = fact[fact['avg_price'].notna()]
+    prices = (pd.DataFrame({'decade': priced['decade'], 'dish_id': priced['dish_id'], 'price': priced['avg_price']})
+              .groupby(['decade', 'dish_id', 'price']).size().rename('n').reset_index())
+    return counts, prices
+
+
+def _merge_counts(old, new, keys):
+    if old is None:
+        return new
+    return pd.concat([old, new]).groupby(keys, as_index=False)['n'].sum()
+
+
+def _load_state(state_dir):
+    try:
+        with open(os.path.join(state_dir, STATE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _save_state(state_dir, state):
+    tmp_path = os.path.join(state_dir, STATE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, os.path.join(state_dir, STATE))
+
+
+def _new_state():
+    return {'marks': {}, 'menus': [], 'pages': [], 'fact': [], 'pending': None,
+            'counts': None, 'prices': None, 'next_part': 0}
+
+
+def _parts(state):
+    names = state['menus'] + state['pages'] + state['fact']
+    return set(names + [state[key] for key in ('pending', 'counts', 'prices') if state[key]])
+
+
+def _write_part(state_dir, state, kind, df):
+    name = f"{kind}-{state['next_part']:05d}"
+    state['next_part'] += 1
+    write_frame(os.path.join(state_dir, name), df)
+    return name
+
+
+def _read_part(state_dir, name):
+    return read_frame(os.path.join(state_dir, name)) if name else None
+
+
+def _read_parts(state_dir, names, empty):
+    if not names:
+        return empty
+    return pd.concat([_read_part(state_dir, name) for name in names], ignore_index=True)
+
+
+def refresh(state_dir=STATE_DIR, rebuild=False, verbose=True):
+    """
+    Bring the joined fact table and per-decade aggregates up to date.
+
+    Each tracked source (Menu, MenuPage, MenuItem) is scanned from its
+    high-water mark (see scan_table) and only the appended rows are
+    parsed. New menus and pages are added to the stored lookups, and new
+    menu items are joined and appended to the fact table as a new part.
+    Their decade counts are added to the stored aggregates. Items whose
+    page or menu is not there yet are kept and retried when Menu or
+    MenuPage grows. If any source was edited other than by appending, or
+    rebuild is True, the state is discarded and rebuilt from the full
+    files. Either way the result equals a full recompute (see verify).
+
+    Everything is written to new part directories under state_dir, and
+    state.json, which lists the live parts, is replaced last. An
+    interrupted run leaves the previous state intact.
+    Returns {'rebuilt': bool, 'rows': {table: new rows}, 'joined': new fact rows}.
+    """
+    start = time.perf_counter()
+    state = None if rebuild else _load_state(state_dir)
+    scans = {}
+    if state is not None:
+        scans = {table: scan_table(table, SOURCE_FILES[table], state['marks'].get(table)) for table in TRACKED}
+        edited = [table for table, (rows, _) in scans.items() if rows is None]
+        if edited:
+            if verbose:
+                print(f"Non-append edit in {', '.join(SOURCE_FILES[t] for t in edited)}: full rebuild")
+            state = None
+    rebuilt = state is None
+    if rebuilt:
+        shutil.rmtree(state_dir, ignore_errors=True)
+        os.makedirs(state_dir)
+        state = _new_state()
+        scans = {table: scan_table(table, SOURCE_FILES[table]) for table in TRACKED}
+    old_parts = _parts(state)
+
+    menu_rows, page_rows, item_rows = (scans[table][0] for table in TRACKED)
+    if len(menu_rows):
+        state['menus'].append(_write_part(state_dir, state, 'menus', _menu_part(menu_rows)))
+    if len(page_rows):
+        state['pages'].append(_write_part(state_dir, state, 'pages', _page_part(page_rows)))
+
+    items = item_rows[item_rows['dish_id'].notna() & item_rows['menu_page_id'].notna()]
+    pending = _read_part(state_dir, state['pending'])
+    if pending is not None and (len(menu_rows) or len(page_rows)):
+        # New menus or pages may complete items that were waiting for them
+        items, pending = pd.concat([pending, items], ignore_index=True), None
+
+    joined = 0
+    if len(items):
+        fact, waiting = join_items(items, _read_parts(state_dir, state['pages'], _page_part(_no_rows('MenuPage'))),
+                                   _read_parts(state_dir, state['menus'], _menu_part(_no_rows('Menu'))))
+        if pending is not None:
+            waiting = pd.concat([pending, waiting], ignore_index=True)
+        state['pending'] = _write_part(state_dir, state, 'pending', waiting) if len(waiting) else None
+
+        joined = len(fact)
+        if joined:
+            state['fact'].append(_write_part(state_dir, state, 'fact', fact))
+            if len(state['fact']) > MAX_FACT_PARTS:
+                state['fact'] = [_write_part(state_dir, state, 'fact', _read_parts(state_dir, state['fact'], None))]
+            counts, prices = aggregate(fact)
+            state['counts'] = _write_part(state_dir, state, 'counts', _merge_counts(
+                _read_part(state_dir, state['counts']), counts, ['decade', 'dish_id']))
+            state['prices'] = _write_part(state_dir, state, 'prices', _merge_counts(
+                _read_part(state_dir, state['prices']), prices, ['decade', 'dish_id', 'price']))
+
+    state['marks'] = {table: scans[table][1] for table in TRACKED}
+    _save_state(state_dir, state)
+    for name in old_parts - _parts(state):
+        shutil.rmtree(os.path.join(state_dir, name), ignore_errors=True)
+
+    added = {table: len(scans[table][0]) for table in TRACKED}
+    if verbose:
+        action = "Rebuilt" if rebuilt else "Updated"
+        print(f"{action} {state_dir} in {time.perf_counter() - start:.1f}s: "
+              + ", ".join(f"+{n:,} {table}" for table, n in added.items())
+              + f" -> +{joined:,} joined menu items")
+    return {'rebuilt': rebuilt, 'rows': added, 'joined': joined}
+
+
+def load_fact(state_dir=STATE_DIR):
+    """The joined fact table: one row per menu item dated 1850-2020."""
+    empty = join_items(_no_rows('MenuItem'), _page_part(_no_rows('MenuPage')), _menu_part(_no_rows('Menu')))[0]
+    return _read_parts(state_dir, _load_state(state_dir)['fact'], empty)
+
+
+def load_aggregates(state_dir=STATE_DIR):
+    """Stored (decade, dish_id, n) counts and (decade, dish_id, price, n) price counts."""
+    state = _load_state(state_dir)
+    counts = _read_part(state_dir, state['counts'])
+    prices = _read_part(state_dir, state['prices'])
+    if counts is None:
+        counts = pd.DataFrame({'decade': [], 'dish_id': [], 'n': []}, dtype=np.int64)
+        prices = pd.DataFrame({'decade': [], 'dish_id': [], 'price': [], 'n': []}).astype(
+            {'decade': np.int64, 'dish_id': np.int64, 'n': np.int64})
+    return counts, prices
+
+
+def detailed_data(top_dishes, fact, output_path, dish_map=None):
+    """
+    dish_extract.extract_detailed answered from the fact table.
+
+    Rows and order match stream_detailed_data, and the CSV written to
+    output_path is byte-identical to it.
+    """
+    dishes = top_dishes.set_index('id')[['name', 'times_appeared']]
+    dish_ids = fact['dish_id'] if dish_map is None else canonical_ids(fact['dish_id'], dish_map)
+    hit = np.asarray(pd.Index(dishes.index).get_indexer(dish_ids))
+    rows, dish = fact[hit >= 0], dishes.iloc[hit[hit >= 0]]
+
+    parts = []
+    if len(rows):
+        parts.append(pd.DataFrame({
+            'dish_id': dish.index.to_numpy(),
+            'dish_name': dish['name'].to_numpy(),
+            'price': rows['price'].to_numpy(),
+            'high_price': rows['high_price'].to_numpy(),
+            'avg_price': rows['avg_price'].to_numpy(),
+            'date': rows['date'].to_numpy(),
+            'year': rows['year'].to_numpy(),
+            'decade': rows['decade'].to_numpy(),
+            'location': rows['location'].to_numpy(),
+            'venue': rows['venue'].to_numpy(),
+            '_times': dish['times_appeared'].to_numpy(),
+            '_item_id': rows['item_id'].to_numpy(),
+        }))
+    data = sort_detailed(parts)
+    write_detailed(data, output_path)
+    return data
+
+
+def catalog_top_n(n=5, dish_map=None, state_dir=STATE_DIR):
+    """catalog_topn.catalog_top_n (decades only) answered from the stored aggregates."""
+    counts, prices = load_aggregates(state_dir)
+    dish_df = load_source('Dish')
+    if dish_map is not None:
+        dish_df = canonical_dishes(dish_df, dish_map)
+        counts = counts.assign(dish_id=canonical_ids(counts['dish_id'], dish_map))
+        counts = counts.groupby(['decade', 'dish_id'], as_index=False)['n'].sum()
+        prices = prices.assign(dish_id=canonical_ids(prices['dish_id'], dish_map))
+        prices = prices.groupby(['decade', 'dish_id', 'price'], as_index=False)['n'].sum()
+    dish_index = pd.Index(dish_df['id'])
+    counts = counts[counts['dish_id'].isin(dish_index)]
+    prices = prices[prices['dish_id'].isin(dish_index)]
+
+    buckets = {decade: Counter(dict(zip(rows['dish_id'].tolist(), rows['n'].tolist())))
+               for decade, rows in counts.groupby('decade')}
+    price_counts = prices.rename(columns={'decade': 'bucket'}).set_index(['bucket', 'dish_id', 'price'])['n']
+    names = dish_df.set_index('id')['name'].astype(object).to_dict()
+    return rank_buckets(buckets, price_counts if len(price_counts) else None, names, n)
+
+
+def verify(state_dir=STATE_DIR):
+    """Rebuild from scratch in a temporary directory and compare with the incremental state."""
+    fresh_dir = tempfile.mkdtemp(prefix='incremental-check-')
+    try:
+        refresh(fresh_dir, rebuild=True, verbose=False)
+        state, fresh = _load_state(state_dir), _load_state(fresh_dir)
+        mismatches = [table for table in TRACKED
+                      if state['marks'][table]['sha256'] != fresh['marks'][table]['sha256']]
+
+        def same(a, b, keys):
+            if a is None or b is None:
+                return a is None and b is None
+            return a.sort_values(keys, ignore_index=True).equals(b.sort_values(keys, ignore_index=True))
+
+        (counts, prices), (fresh_counts, fresh_prices) = load_aggregates(state_dir), load_aggregates(fresh_dir)
+        checks = {
+            'fact': (load_fact(state_dir), load_fact(fresh_dir), ['item_id']),
+            'counts': (counts, fresh_counts, ['decade', 'dish_id']),
+            'prices': (prices, fresh_prices, ['decade', 'dish_id', 'price']),
+            'pending': (_read_part(state_dir, state['pending']), _read_part(fresh_dir, fresh['pending']), ['id']),
+        }
+        mismatches += [name for name, (incremental, full, keys) in checks.items()
+                       if not same(incremental, full, keys)]
+    finally:
+        shutil.rmtree(fresh_dir, ignore_errors=True)
+
+    if mismatches:
+        print(f"Incremental state differs from a full rebuild: {', '.join(mismatches)}")
+    else:
+        print("Incremental state matches a full rebuild")
+    return not mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally maintained joined fact table and decade aggregates")
+    parser.add_argument('--state', default=STATE_DIR, help=f"state directory (default {STATE_DIR})")
+    parser.add_argument('--rebuild', action='store_true', help="discard the state and rebuild from the full files")
+    parser.add_argument('--check', action='store_true', help="compare the updated state with a full rebuild")
+    parser.add_argument('--clusters', metavar='PATH', help="rank by canonical dish using this dish_clusters.py mapping")
+    args = parser.parse_args()
+
+    refresh(args.state, rebuild=args.rebuild)
+    if args.check:
+        verify(args.state)
+    else:
+        results = catalog_top_n(dish_map=load_mapping(args.clusters) if args.clusters else None,
+                                state_dir=args.state)
+        print_rankings(results)
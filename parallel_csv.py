@@ -0,0 +1,193 @@
+import argparse
+import io
+import os
+import time
+from multiprocessing import Pool
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Worker count used when callers don't pass one; CSV_WORKERS=1 turns
+# parallel parsing off everywhere
+DEFAULT_WORKERS = int(os.environ.get('CSV_WORKERS', os.cpu_count() or 1))
+# Files smaller than this are parsed directly; a process pool costs more than it saves
+MIN_PARALLEL_BYTES = 16 << 20
+BLOCK_SIZE = 16 << 20
+
+
+def _header_end(f):
+    """Byte offset just past the header line, allowing for quoted newlines."""
+    f.seek(0)
+    parity, offset = 0, 0
+    for line in f:
+        parity ^= line.count(b'"') & 1
+        offset += len(line)
+        if not parity:
+            return offset
+    return offset
+
+
+def split_ranges(path, parts):
+    """
+    Split a CSV's data rows into about `parts` byte ranges on row boundaries.
+
+    A newline ends a row only when an even number of quote characters
+    precedes it. Escaped quotes ("") come in pairs and don't change the
+    parity. One sequential pass counts quotes up to each target offset,
+    and each cut then moves forward to the next newline outside quotes.
+    Returns (header_end, [(start, end), ...]).
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        data_start = _header_end(f)
+        step = max(1, (size - data_start) // max(parts, 1))
+        targets = [data_start + i * step for i in range(1, parts)]
+
+        cuts = [data_start]
+        f.seek(0)
+        quotes, offset = 0, 0
+        for target in targets:
+            if target <= cuts[-1]:
+                continue
+            # Count quotes up to the target, then walk to a newline outside quotes
+            while offset < target:
+                block = f.read(min(BLOCK_SIZE, target - offset))
+                quotes += block.count(b'"')
+                offset += len(block)
+            parity = quotes & 1
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    offset = size
+                    break
+                pos = 0
+                newline = block.find(b'\n', pos)
+                while newline >= 0:
+                    parity ^= block.count(b'"', pos, newline) & 1
+                    if not parity:
+                        break
+                    pos = newline
+                    newline = block.find(b'\n', newline + 1)
+                if newline >= 0:
+                    quotes += block.count(b'"', 0, newline + 1)
+                    offset += newline + 1
+                    f.seek(offset)
+                    break
+                parity ^= block.count(b'"', pos) & 1
+                quotes += block.count(b'"')
+                offset += len(block)
+            if offset >= size:
+                break
+            cuts.append(offset)
+        cuts.append(size)
+
+    return data_start, [(start, end) for start, end in zip(cuts, cuts[1:]) if end > start]
+
+
+def _parse_range(args):
+    path, start, end, names, read_csv_kwargs = args
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), header=None, names=names, **read_csv_kwargs)
+
+
+def _column_names(path, read_csv_kwargs):
+    encoding = read_csv_kwargs.get('encoding')
+    return list(pd.read_csv(path, nrows=0, encoding=encoding).columns)
+
+
+def _concat(parts):
+    """Concatenate range frames, unifying categories instead of falling back to object."""
+    if len(parts) == 1:
+        return parts[0]
+    columns = {}
+    for name in parts[0].columns:
+        if isinstance(parts[0][name].dtype, pd.CategoricalDtype):
+            # Sorted, as pd.read_csv(dtype='category') orders them
+            columns[name] = union_categoricals([part[name] for part in parts], sort_categories=True)
+    df = pd.concat([part.drop(columns=list(columns)) for part in parts], ignore_index=True)
+    for name, values in columns.items():
+        df[name] = values
+    return df[parts[0].columns]
+
+
+def _tasks(path, ranges, read_csv_kwargs):
+    names = _column_names(path, read_csv_kwargs)
+    return [(path, start, end, names, read_csv_kwargs) for start, end in ranges]
+
+
+def read_csv_parallel(path, workers=None, **read_csv_kwargs):
+    """
+    pd.read_csv(path, **read_csv_kwargs), parsed by `workers` processes.
+
+    The file is split into one byte range per worker (see split_ranges),
+    and each range is parsed with the caller's options. Header-related
+    options (header, names, skiprows, nrows, chunksize) are not supported.
+    Small files, and workers=1, go straight to pd.read_csv.
+    """
+    workers = workers or DEFAULT_WORKERS
+    if workers <= 1 or os.path.getsize(path) < MIN_PARALLEL_BYTES:
+        return pd.read_csv(path, **read_csv_kwargs)
+
+    _, ranges = split_ranges(path, workers)
+    with Pool(min(workers, len(ranges))) as pool:
+        parts = pool.map(_parse_range, _tasks(path, ranges, read_csv_kwargs))
+    return _concat(parts)
+
+
+def _row_bytes(path, sample=1 << 16):
+    """Average row length in the first `sample` bytes."""
+    with open(path, 'rb') as f:
+        head = f.read(sample)
+    return max(1, len(head) // max(1, head.count(b'\n')))
+
+
+def iter_csv_parallel(path, workers=None, chunksize=200_000, **read_csv_kwargs):
+    """
+    Chunk iterator over a CSV whose chunks are parsed in parallel.
+
+    Chunks are byte ranges of roughly `chunksize` rows (estimated from the
+    average row length) and are yielded in file order. Up to `workers`
+    chunks are parsed ahead of the consumer.
+    """
+    workers = workers or DEFAULT_WORKERS
+    chunk_bytes = chunksize * _row_bytes(path)
+    _, ranges = split_ranges(path, max(1, os.path.getsize(path) // chunk_bytes))
+    tasks = _tasks(path, ranges, read_csv_kwargs)
+    if workers <= 1 or len(tasks) == 1:
+        for task in tasks:
+            yield _parse_range(task)
+        return
+    with Pool(workers) as pool:
+        yield from pool.imap(_parse_range, tasks)
+
+
+def benchmark(path, max_workers=None, repeat=1, **read_csv_kwargs):
+    """Time read_csv_parallel with 1..max_workers workers and print the speed-up."""
+    max_workers = max_workers or os.cpu_count() or 1
+    print(f"Parallel CSV parse of {path} ({os.path.getsize(path) / 1e6:.0f} MB)")
+    print(f"{'Workers':>8} {'Seconds':>9} {'Speed-up':>9}")
+    baseline = None
+    for workers in range(1, max_workers + 1):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if workers == 1:
+                df = pd.read_csv(path, **read_csv_kwargs)
+            else:
+                _, ranges = split_ranges(path, workers)
+                with Pool(workers) as pool:
+                    df = _concat(pool.map(_parse_range, _tasks(path, ranges, read_csv_kwargs)))
+            best = min(best, time.perf_counter() - start)
+        baseline = baseline or best
+        print(f"{workers:>8} {best:>9.2f} {baseline / best:>8.2f}x   ({len(df):,} rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel byte-range CSV parsing")
+    parser.add_argument('path', nargs='?', default='MenuItem-cleaned.csv')
+    parser.add_argument('--max-workers', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+    benchmark(args.path, args.max_workers, args.repeat)
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime
+
+# Stage markers used by script.py and data_quality_assessment.py. Nothing is
+# recorded until record() or enable() is called, so while tracing is off a
+# marker costs one global lookup. Setting PROFILE_TRACE=path turns tracing
+# on for the whole process.
+TRACE_ENV = 'PROFILE_TRACE'
+_stages = None
+_current = None
+_run = None
+_trace_path = None
+
+
+def _peak_rss_mb():
+    """Peak RSS since the last reset, from /proc on Linux, else the process-lifetime peak."""
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM (Linux 4.0+), so each stage gets its own peak
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _cpu_seconds():
+    # Includes finished child processes, e.g. parallel_csv's worker pool
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def record():
+    """Start recording stages in memory. Returns the list completed stages are appended to."""
+    global _stages, _current, _run
+    _stages, _current, _run = [], None, None
+    return _stages
+
+
+def enable(path):
+    """Record stages and write them as a JSON trace to `path` whenever a run finishes."""
+    global _trace_path
+    _trace_path = path
+    record()
+
+
+def begin(run):
+    """Start a named run (e.g. 'main'); later stages are recorded under it."""
+    global _run
+    if _stages is None:
+        return
+    finish()
+    _run = run
+
+
+def stage(name):
+    """End the current stage, if any, and start one called `name`."""
+    global _current
+    if _stages is None:
+        return
+    now, cpu = time.perf_counter(), _cpu_seconds()
+    if _current is not None:
+        _stages.append({
+            'run': _run,
+            'stage': _current['stage'],
+            'wall_s': round(now - _current['wall'], 6),
+            'cpu_s': round(cpu - _current['cpu'], 6),
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+            'rows': _current['rows'],
+        })
+    _current = None
+    if name is not None:
+        _reset_peak_rss()
+        _current = {'stage': name, 'wall': time.perf_counter(), 'cpu': _cpu_seconds(), 'rows': None}
+
+
+def rows(n):
+    """Record the number of rows the current stage produced or processed."""
+    if _current is not None:
+        _current['rows'] = int(n)
+
+
+def finish():
+    """End the current stage and, when tracing to a file, write the trace."""
+    if _stages is None:
+        return
+    stage(None)
+    if _trace_path:
+        write_trace(_trace_path, _stages)
+
+
+def stop():
+    """End the current stage, stop recording and return the recorded stages."""
+    global _stages, _trace_path
+    finish()
+    stages, _stages, _trace_path = _stages, None, None
+    return stages or []
+
+
+def write_trace(path, stages):
+    """Write stages as a JSON trace with enough context to compare runs."""
+    trace = {
+        'command': sys.argv,
+        'written': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'stages': stages,
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load_trace(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def diff_traces(base, new):
+    """Print two traces stage by stage: wall time, CPU time, peak RSS and rows."""
+    def by_stage(trace):
+        return {(s['run'], s['stage']): s for s in trace['stages']}
+
+    base_stages, new_stages = by_stage(base), by_stage(new)
+    keys = list(base_stages) + [key for key in new_stages if key not in base_stages]
+    print(f"{'Stage':<28} {'Wall s':>17} {'CPU s':>17} {'Peak MB':>15} {'Rows':>23}")
+    print("-" * 104)
+    for key in keys:
+        old, cur = base_stages.get(key, {}), new_stages.get(key, {})
+        cells = []
+        for field, fmt, width in (('wall_s', '.3f', 17), ('cpu_s', '.3f', 17), ('peak_rss_mb', ',.0f', 15),
+                                  ('rows', ',', 23)):
+            a, b = old.get(field), cur.get(field)
+            text = f"{'-' if a is None else format(a, fmt)} -> {'-' if b is None else format(b, fmt)}"
+            cells.append(f"{text:>{width}}")
+        label = '.'.join(part for part in key if part)
+        print(f"{label:<28} " + ' '.join(cells))
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two stage traces written with --trace or PROFILE_TRACE")
+    parser.add_argument('base')
+    parser.add_argument('new')
+    args = parser.parse_args()
+    diff_traces(load_trace(args.base), load_trace(args.new))
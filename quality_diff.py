@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# Change kinds, from row-level to cell-level
+ROW_DELETED = 'row_deleted'
+ROW_INSERTED = 'row_inserted'
+VALUE_FILLED = 'value_filled'
+VALUE_CLEARED = 'value_cleared'
+WHITESPACE = 'whitespace'
+CASE = 'case'
+PUNCTUATION = 'punctuation'
+NUMERIC_COERCION = 'numeric_coercion'
+OTHER = 'other'
+
+CHANGE_COLUMNS = ['id', 'column', 'kind', 'original', 'cleaned']
+
+
+def _collapse_whitespace(text):
+    return text.str.split().str.join(' ')
+
+
+def classify_text_changes(original, cleaned):
+    """
+    Label each changed text pair with the lightest normalization that makes
+    the two strings equal: whitespace, then case, then punctuation. Pairs
+    that none of these explain are OTHER.
+    """
+    original = _collapse_whitespace(original.astype(str))
+    cleaned = _collapse_whitespace(cleaned.astype(str))
+    lower_o, lower_c = original.str.lower(), cleaned.str.lower()
+    strip_o = _collapse_whitespace(lower_o.str.replace(r'[^\w\s]', ' ', regex=True))
+    strip_c = _collapse_whitespace(lower_c.str.replace(r'[^\w\s]', ' ', regex=True))
+    return np.select([original == cleaned, lower_o == lower_c, strip_o == strip_c],
+                     [WHITESPACE, CASE, PUNCTUATION], OTHER)
+
+
+def diff_table(original, cleaned, columns, key='id'):
+    """
+    Align two versions of a table by `key` in one merge and list every change.
+
+    Returns one row per changed cell or row with columns id, column, kind,
+    original and cleaned. Rows present on only one side are
+    ROW_DELETED or ROW_INSERTED. A missing value on one side is
+    VALUE_FILLED or VALUE_CLEARED. Other text changes are classified by
+    classify_text_changes(). Changed numbers are NUMERIC_COERCION.
+    """
+    def side(df):
+        part = df[[key] + columns]
+        # Categoricals from different files have different categories and
+        # cannot be compared with each other directly
+        return part.astype({c: object for c in columns if isinstance(part[c].dtype, pd.CategoricalDtype)})
+
+    merged = side(original).merge(side(cleaned), on=key, how='outer', suffixes=('_orig', '_clean'),
+                                  indicator=True, sort=True)
+    changes = []
+
+    for kind, side_name in ((ROW_DELETED, 'left_only'), (ROW_INSERTED, 'right_only')):
+        ids = merged.loc[merged['_merge'] == side_name, key]
+        if len(ids):
+            changes.append(pd.DataFrame({'id': ids.to_numpy(), 'column': None, 'kind': kind,
+                                         'original': None, 'cleaned': None}))
+
+    both = merged[merged['_merge'] == 'both']
+    for column in columns:
+        orig, clean = both[f"{column}_orig"], both[f"{column}_clean"]
+        orig_na, clean_na = orig.isna().to_numpy(), clean.isna().to_numpy()
+        numeric = pd.api.types.is_numeric_dtype(orig.dtype) and pd.api.types.is_numeric_dtype(clean.dtype)
+        if numeric:
+            equal = orig.to_numpy(dtype=np.float64, na_value=np.nan) == clean.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            equal = orig.to_numpy(dtype=object, na_value=None) == clean.to_numpy(dtype=object, na_value=None)
+        changed = ~(equal | (orig_na & clean_na))
+        if not changed.any():
+            continue
+
+        orig, clean = orig[changed], clean[changed]
+        orig_na, clean_na = orig_na[changed], clean_na[changed]
+        kinds = np.full(len(orig), NUMERIC_COERCION, dtype=object)
+        kinds[orig_na] = VALUE_FILLED
+        kinds[clean_na] = VALUE_CLEARED
+        both_present = ~(orig_na | clean_na)
+        if both_present.any() and not numeric:
+            kinds[both_present] = classify_text_changes(orig[both_present], clean[both_present])
+
+        changes.append(pd.DataFrame({'id': both.loc[changed, key].to_numpy(), 'column': column, 'kind': kinds,
+                                     'original': orig.to_numpy(dtype=object, na_value=None),
+                                     'cleaned': clean.to_numpy(dtype=object, na_value=None)}))
+
+    if not changes:
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+    return pd.concat(changes, ignore_index=True)
+
+
+def change_summary(changes):
+    """Number of changes of each kind, most frequent first."""
+    return changes['kind'].value_counts()
+
+
+def score_name_changes(changes):
+    """
+    Rate text changes by how instructive they are as report examples.
+
+    Punctuation involvement scores 3, a pure case change 2, a change in word
+    count 2, and a change in length 1. Returns the text changes sorted by
+    score, highest first, with ties broken by higher id first.
+    """
+    text = changes[changes['kind'].isin([WHITESPACE, CASE, PUNCTUATION, OTHER])]
+    original = text['original'].astype(str)
+    cleaned = text['cleaned'].astype(str)
+
+    has_punct_diff = (original + cleaned).str.contains(r'[.,;:!?()\[\]{}"\'-]', regex=True)
+    has_case_diff = original.str.lower() == cleaned.str.lower()
+    has_spacing_diff = original.str.split().str.len() != cleaned.str.split().str.len()
+    has_length_diff = original.str.len() != cleaned.str.len()
+
+    score = 3 * has_punct_diff + 2 * has_case_diff + 2 * has_spacing_diff + has_length_diff
+    return text.assign(score=score.to_numpy()).sort_values(['score', 'id'], ascending=False, kind='stable')
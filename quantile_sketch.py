@@ -0,0 +1,240 @@
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from streaming_join import avg_prices, iter_menu_items, join_menus, menu_lookup, page_lookup
+from table_schemas import SOURCE_FILES, load_source
+
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+def k_for_error(eps):
+    """
+    Smallest KLL k whose normalized rank error is at most eps.
+
+    Uses the empirical fit from the Apache DataSketches KLL documentation,
+    eps ~= 2.296 / k**0.9723 (single quantile, 99% confidence).
+    """
+    return max(8, int(np.ceil((2.296 / eps) ** (1 / 0.9723))))
+
+
+class KLLSketch:
+    """
+    Mergeable KLL quantile sketch over float values.
+
+    Items live in levels of compactors, and an item at level h stands for
+    2**h inputs. When a level outgrows its capacity it is sorted, and every
+    other item (from a random offset) is promoted to the next level. Until
+    the first compaction the sketch holds every value, and quantiles are
+    exact.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def for_error(cls, eps, seed=None):
+        return cls(k_for_error(eps), seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind at this level
+                keep, items = (items[:1], items[1:]) if len(items) % 2 else (items[:0], items)
+                offset = self._rng.integers(2)
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[offset::2]])
+                self.levels[h] = keep
+            h += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.n += len(values)
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Approximate quantiles; exact (np.quantile) until the first compaction."""
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        if len(self.levels) == 1:
+            return np.quantile(self.levels[0], qs)
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** h) for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        cum = np.cumsum(weights[order])
+        idx = np.searchsorted(cum, qs * cum[-1], side='left')
+        return values[order][np.minimum(idx, len(values) - 1)]
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+
+def _sketch_chunk(keys, k, seed):
+    """Sketches for every (bucket, dish_id) group in one chunk of keys."""
+    sketches = {}
+    prices = keys['price'].to_numpy()
+    for group, positions in keys.groupby(['bucket', 'dish_id']).indices.items():
+        sketches[group] = KLLSketch(k, seed).update(prices[positions])
+    return sketches
+
+
+def _merge_into(sketches, partial):
+    for group, sketch in partial.items():
+        if group in sketches:
+            sketches[group].merge(sketch)
+        else:
+            sketches[group] = sketch
+
+
+def price_sketches(eps=0.01, width=10, workers=1, menuitem_path=SOURCE_FILES['MenuItem'],
+                   chunksize=200_000, seed=0):
+    """
+    Per-(bucket, dish) KLL sketches of avg_price over all of MenuItem.
+
+    MenuItem is streamed in chunks, and each chunk is joined to its menu
+    year. Priced rows are sketched per group, either inline or on a process
+    pool of `workers`, and the per-chunk sketches are merged in chunk order.
+    At most 2 * workers chunks are in flight, so memory stays bounded. The
+    result is the same kind of sketch whatever the chunking or worker count.
+    """
+    menus = menu_lookup(load_source('Menu'))
+    page_menu = page_lookup(load_source('MenuPage'))
+    dish_index = pd.Index(load_source('Dish')['id'])
+    k = k_for_error(eps)
+
+    def chunk_keys():
+        for chunk in iter_menu_items(menuitem_path, chunksize):
+            chunk = chunk[chunk['dish_id'].isin(dish_index)]
+            chunk, menu = join_menus(chunk, page_menu, menus)
+            keys = pd.DataFrame({
+                'bucket': menu['year'].to_numpy() // width * width,
+                'dish_id': chunk['dish_id'].to_numpy(dtype=np.int64),
+                'price': avg_prices(chunk['price'], chunk['high_price']),
+            })
+            yield keys.dropna(subset=['price'])
+
+    sketches = {}
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = deque()
+            for i, keys in enumerate(chunk_keys()):
+                futures.append(pool.submit(_sketch_chunk, keys, k, seed + i))
+                if len(futures) >= 2 * workers:
+                    _merge_into(sketches, futures.popleft().result())
+            while futures:
+                _merge_into(sketches, futures.popleft().result())
+    else:
+        for i, keys in enumerate(chunk_keys()):
+            _merge_into(sketches, _sketch_chunk(keys, k, seed + i))
+    return sketches
+
+
+def sketch_table(sketches, qs=QUANTILES):
+    """Flatten {(bucket, dish_id): sketch} into one row per group."""
+    rows = [(bucket, dish, sketch.n, *sketch.quantiles(qs)) for (bucket, dish), sketch in sketches.items()]
+    columns = ['bucket', 'dish_id', 'n'] + [f"p{round(100 * q)}" for q in qs]
+    return pd.DataFrame(rows, columns=columns).sort_values(['bucket', 'dish_id'], ignore_index=True)
+
+
+def rank_error(ordered, value, q):
+    """
+    How far q lies outside the normalized ranks that value occupies in ordered.
+
+    A value that repeats covers a range of ranks. A value between two
+    neighbouring data points, as an interpolated quantile is, covers the
+    ranks of both, so an exact np.quantile answer has error 0.
+    """
+    low = np.searchsorted(ordered, value, 'left')
+    high = np.searchsorted(ordered, value, 'right')
+    if low == high:
+        low = np.searchsorted(ordered, ordered[max(low - 1, 0)], 'left')
+        high = np.searchsorted(ordered, ordered[min(high, len(ordered) - 1)], 'right')
+    return max(low / len(ordered) - q, q - high / len(ordered), 0.0)
+
+
+def accuracy_report(dataset='final_cleaned_dataset.csv', eps=0.01, qs=QUANTILES, seed=0):
+    """
+    Compare sketch quantiles with np.median / np.quantile on the top-5 dataset.
+
+    Each (decade, dish) group of the dataset is sketched in 1,000-row
+    pieces that are then merged, which exercises the chunked path. The
+    report gives the worst normalized rank error and the worst absolute
+    price difference. The rank error is how far q lies outside the range of
+    ranks the sketch's answer occupies in the exact data (see rank_error).
+    """
+    data = pd.read_csv(dataset).dropna(subset=['avg_price'])
+    k = k_for_error(eps)
+    print(f"Sketch accuracy vs exact quantiles (eps={eps}, k={k})")
+    print("=" * 55)
+
+    worst_rank = {q: 0.0 for q in qs}
+    worst_value = {q: 0.0 for q in qs}
+    groups = 0
+    for (decade, dish), prices in data.groupby(['decade', 'dish_name'])['avg_price']:
+        values = prices.to_numpy()
+        sketch = KLLSketch(k, seed)
+        for start in range(0, len(values), 1000):
+            sketch.merge(KLLSketch(k, seed + start).update(values[start:start + 1000]))
+        ordered = np.sort(values)
+        for q in qs:
+            estimate = sketch.quantile(q)
+            exact = np.median(values) if q == 0.5 else np.quantile(values, q)
+            worst_rank[q] = max(worst_rank[q], rank_error(ordered, estimate, q))
+            worst_value[q] = max(worst_value[q], abs(estimate - exact))
+        groups += 1
+
+    print(f"Groups compared: {groups} (decade, dish) pairs, {len(data):,} priced records")
+    for q in qs:
+        print(f"  p{round(100 * q):<3} max rank error {worst_rank[q]:.4f} "
+              f"(bound {eps}), max price difference ${worst_value[q]:.4f}")
+    return worst_rank, worst_value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming quantile sketches of dish prices")
+    parser.add_argument('--eps', type=float, default=0.01, help="normalized rank error bound")
+    parser.add_argument('--width', type=int, default=10, help="bucket width in years (10 = decades)")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', default='price_quantiles.csv')
+    parser.add_argument('--report', action='store_true',
+                        help="compare against exact quantiles on final_cleaned_dataset.csv instead")
+    args = parser.parse_args()
+
+    if args.report:
+        accuracy_report(eps=args.eps)
+    else:
+        start = time.perf_counter()
+        table = sketch_table(price_sketches(args.eps, args.width, args.workers))
+        table.to_csv(args.output, index=False)
+        print(f"Sketched {table['n'].sum():,} prices in {len(table):,} (bucket, dish) groups "
+              f"in {time.perf_counter() - start:.1f}s -> {args.output}")
@@ -0,0 +1,353 @@
+import argparse
+import json
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from decade_stats import rank_dishes
+from dish_clusters import CLUSTERS_PATH, canonical_dishes, canonical_ids, load_mapping
+from facet_index import FacetIndex, encode
+import incremental
+from streaming_join import top_dishes_frame
+from table_schemas import load_source
+
+DEFAULT_PORT = 8513
+CACHE_SIZE = 256
+# Latency percentiles cover the most recent queries only, so memory stays flat
+LATENCY_WINDOW = 10_000
+RESULT_COLUMNS = ['bucket', 'rank', 'dish_name', 'frequency', 'share', 'median_price', 'bucket_total']
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache of query results."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def info(self):
+        with self.lock:
+            return {'size': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+class FactStore:
+    """
+    The joined MenuItem/MenuPage/Menu fact table, held in memory.
+
+    It is loaded through incremental.py, so a restart or reload() parses
+    only rows appended since the last run. Rows are sorted by year and kept
+    as a FacetIndex over venue, location and dish, plus an avg_price
+    column. Rows whose dish is not in Dish are dropped, as the detailed
+    query's inner join does.
+    """
+
+    def __init__(self, state_dir=incremental.STATE_DIR, clusters=None):
+        self.state_dir = state_dir
+        self.clusters = clusters
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.load()
+
+    def load(self):
+        start = time.perf_counter()
+        incremental.refresh(self.state_dir, verbose=False)
+        fact = incremental.load_fact(self.state_dir)
+        dish_df = load_source('Dish')
+        dish_ids = fact['dish_id']
+        if self.clusters:
+            dish_map = load_mapping(self.clusters)
+            dish_df = canonical_dishes(dish_df, dish_map)
+            dish_ids = canonical_ids(dish_ids, dish_map)
+
+        dishes = pd.Index(dish_df['id'])
+        dish_pos = dishes.get_indexer(dish_ids)
+        keep = np.flatnonzero(dish_pos >= 0)
+        keep = keep[np.argsort(fact['year'].to_numpy()[keep], kind='stable')]
+        names = pd.Categorical(dish_df['name'].astype(object).fillna(''))
+        # Dish ids by times_appeared, as TOP_DISHES_QUERY orders them, for top_dishes=K
+        by_popularity = top_dishes_frame(dish_df, len(dish_df))['id'].to_numpy()
+        index = FacetIndex(fact['year'].to_numpy()[keep].astype(np.int16), {
+            'venue': encode(fact['venue'].to_numpy()[keep]),
+            'location': encode(fact['location'].to_numpy()[keep]),
+            'dish': (dish_pos[keep].astype(np.int32), dishes),
+        })
+        avg_price = fact['avg_price'].to_numpy()[keep]
+        # Swap everything in at once so in-flight queries see one consistent snapshot
+        with self.lock:
+            self.index = index
+            self.avg_price = avg_price
+            self.by_popularity = by_popularity
+            self.name_codes = names.codes.astype(np.int32)
+            self.name_categories = names.categories
+            self.generation += 1
+        self.load_seconds = time.perf_counter() - start
+        return len(index)
+
+    def snapshot(self):
+        with self.lock:
+            return self.index, self.avg_price, self.name_codes, self.name_categories
+
+    def top_dish_ids(self, k):
+        with self.lock:
+            return tuple(self.by_popularity[:k].tolist())
+
+    def select(self, dishes=None, start=1850, end=2020, venue=None, location=None):
+        """
+        Row ids matching the filters, found through the facet index.
+
+        dishes restricts rows to those dish ids (default: every dish).
+        start/end is an inclusive year range. venue and location keep rows
+        whose value contains any of the given strings, case-insensitively.
+        """
+        index = self.snapshot()[0]
+        filters = {}
+        if dishes is not None:
+            positions = index.values['dish'].get_indexer(list(dishes))
+            filters['dish'] = positions[positions >= 0]
+        for column, patterns in (('venue', venue), ('location', location)):
+            if patterns:
+                filters[column] = index.matching_codes(column, patterns)
+        return index.select(start, end, filters)
+
+    def query(self, dishes=None, n=5, start=1850, end=2020, width=10, venue=None, location=None):
+        """
+        Top-n dishes and median avg_price per year bucket, over filtered rows.
+
+        Filters are as for select(). width sets the bucket size (10 gives
+        decades). The output matches decade_stats.rank_dishes. With the
+        global top 5 dish ids and defaults elsewhere, it equals script.py's
+        results.
+        """
+        return self.rank_rows(self.select(dishes, start, end, venue, location), n, width)
+
+    def rank_rows(self, rows, n=5, width=10):
+        index, avg_price, name_codes, name_categories = self.snapshot()
+        # Names are ranked by their code: categories are sorted, so ties still break alphabetically
+        data = pd.DataFrame({
+            'year': index.year[rows].astype(np.int64),
+            'dish_name': name_codes[index.codes['dish'][rows]],
+            'avg_price': avg_price[rows],
+        })
+        if data.empty:
+            return pd.DataFrame(columns=RESULT_COLUMNS), 0
+        results = rank_dishes(data, n=n, width=width, bucket_col='bucket')
+        results['dish_name'] = name_categories.to_numpy(dtype=object)[results['dish_name'].to_numpy()]
+        return results, len(data)
+
+    def facets(self, column, dishes=None, start=1850, end=2020, venue=None, location=None):
+        """Row counts per venue or location value among the rows matching the filters."""
+        if column not in ('venue', 'location'):
+            raise ValueError("facet column must be venue or location")
+        return self.snapshot()[0].breakdown(column, self.select(dishes, start, end, venue, location))
+
+
+def _parse_list(values, cast=str):
+    items = [item.strip() for value in values for item in value.split(',')]
+    return tuple(sorted({cast(item) for item in items if item}))
+
+
+def parse_query(params, store):
+    """
+    Normalize URL query parameters into a cache key.
+
+    dishes=1,2,3 ranks those dish ids; top_dishes=K uses the K most frequent
+    dishes (script.py uses 5); with neither, all dishes are ranked.
+    """
+    def one(name, default, cast=int):
+        return cast(params[name][-1]) if name in params else default
+
+    n, width = one('n', 5), one('width', 10)
+    if n < 1 or width < 1:
+        raise ValueError("n and width must be at least 1")
+    if 'dishes' in params:
+        dishes = _parse_list(params['dishes'], int)
+    elif 'top_dishes' in params:
+        dishes = tuple(sorted(store.top_dish_ids(one('top_dishes', 5))))
+    else:
+        dishes = None
+    return (dishes, n, one('start', 1850), one('end', 2020), width,
+            _parse_list(params.get('venue', [])), _parse_list(params.get('location', [])))
+
+
+class QueryService:
+    """Answers queries from a FactStore, through an LRU cache, recording the last LATENCY_WINDOW latencies."""
+
+    def __init__(self, store, cache_size=CACHE_SIZE):
+        self.store = store
+        self.cache = LRUCache(cache_size)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.queries = 0
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def _compute(self, key):
+        _, kind, args = key
+        if kind == 'facets':
+            column, limit, dishes, first, last, venue, location = args
+            counts = self.store.facets(column, dishes, first, last, venue, location)
+            return {'rows_matched': int(counts.sum()), 'values': len(counts),
+                    'facets': [{column: value, 'rows': int(rows)} for value, rows in counts.head(limit).items()]}
+        dishes, n, first, last, width, venue, location = args
+        results, matched = self.store.query(dishes, n, first, last, width, venue, location)
+        records = results[RESULT_COLUMNS].astype(object).where(results[RESULT_COLUMNS].notna(), None)
+        return {'rows_matched': matched, 'results': records.to_dict('records')}
+
+    def _lookup(self, key):
+        """Cached response for key, computing it once even when several clients miss together."""
+        while True:
+            response = self.cache.get(key)
+            if response is not None:
+                return response, True
+            with self.lock:
+                event = self.pending.get(key)
+                if event is None:
+                    event = self.pending[key] = threading.Event()
+                    break
+            event.wait()
+        try:
+            response = self._compute(key)
+            self.cache.put(key, response)
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+        return response, False
+
+    def _answer(self, kind, key, query):
+        start = time.perf_counter()
+        # Results computed before a reload are never served after it
+        response, cached = self._lookup((self.store.generation, kind, key))
+        elapsed_ms = 1000 * (time.perf_counter() - start)
+        with self.lock:
+            self.latencies.append(elapsed_ms)
+            self.queries += 1
+        return {'query': query, 'cached': cached, 'elapsed_ms': round(elapsed_ms, 3), **response}
+
+    def top(self, params):
+        key = parse_query(params, self.store)
+        dishes, n, first, last, width, venue, location = key
+        return self._answer('top', key, {'dishes': dishes, 'n': n, 'start': first, 'end': last, 'width': width,
+                                         'venue': venue, 'location': location})
+
+    def facets(self, params):
+        """Venue or location breakdown (column=venue|location, limit=20) under the same filters as top()."""
+        dishes, _, first, last, _, venue, location = parse_query(params, self.store)
+        column = params.get('column', ['venue'])[-1]
+        if column not in ('venue', 'location'):
+            raise ValueError("column must be venue or location")
+        limit = int(params.get('limit', ['20'])[-1])
+        return self._answer('facets', (column, limit, dishes, first, last, venue, location),
+                            {'column': column, 'limit': limit, 'dishes': dishes, 'start': first, 'end': last,
+                             'venue': venue, 'location': location})
+
+    def stats(self):
+        with self.lock:
+            latencies = np.array(self.latencies)
+            queries = self.queries
+        summary = {'queries': queries}
+        if len(latencies):
+            summary['window'] = len(latencies)
+            summary.update({f"p{q}_ms": round(float(np.percentile(latencies, q)), 3) for q in (50, 95, 99)})
+            summary['max_ms'] = round(float(latencies.max()), 3)
+        return {'rows_resident': len(self.store.snapshot()[0]),
+                'load_seconds': round(self.store.load_seconds, 3), 'cache': self.cache.info(), 'latency': summary}
+
+    def reload(self):
+        """Pick up rows appended to the source CSVs since the last load, then drop cached results."""
+        rows_resident = self.store.load()
+        self.cache.clear()
+        return {'rows_resident': rows_resident, 'load_seconds': round(self.store.load_seconds, 3)}
+
+
+def make_handler(service, quiet=False):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            try:
+                if url.path == '/top':
+                    body = service.top(parse_qs(url.query))
+                elif url.path == '/facets':
+                    body = service.facets(parse_qs(url.query))
+                elif url.path == '/stats':
+                    body = service.stats()
+                elif url.path == '/reload':
+                    body = service.reload()
+                else:
+                    return self._send(404, {'error': f"unknown endpoint {url.path}; use /top, /facets, /stats or /reload"})
+            except ValueError as e:
+                return self._send(400, {'error': str(e)})
+            except Exception as e:
+                # Answer rather than drop the connection; the traceback goes to the server's stderr
+                traceback.print_exc()
+                return self._send(500, {'error': f"{type(e).__name__}: {e}"})
+            self._send(200, body)
+
+        def log_message(self, format, *args):
+            if not quiet:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def serve(port=DEFAULT_PORT, state_dir=incremental.STATE_DIR, clusters=None, cache_size=CACHE_SIZE, quiet=False):
+    store = FactStore(state_dir, clusters)
+    service = QueryService(store, cache_size)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(service, quiet))
+    print(f"Loaded {len(store.snapshot()[0]):,} joined menu items in {store.load_seconds:.1f}s")
+    print(f"Serving on http://127.0.0.1:{port}/top (also /facets, /stats, /reload)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the joined menu data in memory and answer top-N / median "
+                                                 "queries over HTTP")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--state', default=incremental.STATE_DIR,
+                        help=f"incremental state directory the fact table is loaded from (default {incremental.STATE_DIR})")
+    parser.add_argument('--clusters', metavar='PATH', nargs='?', const=CLUSTERS_PATH,
+                        help=f"count and rank by canonical dish (default {CLUSTERS_PATH})")
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="cached query results (LRU)")
+    parser.add_argument('--quiet', action='store_true', help="don't log each request")
+    args = parser.parse_args()
+    serve(args.port, args.state, args.clusters, args.cache_size, args.quiet)
@@ -0,0 +1,497 @@
+import argparse
+import json
+import os
+import re
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# The recorded OpenRefine workflows: history/workflow file, raw CSV, cleaned CSV
+WORKFLOWS = {
+    'MenuItem': ('OpenRefine History/MenuItemCSV/history.json', 'MenuItem.csv', 'MenuItem-cleaned.csv'),
+    'Dish': ('OpenRefine History/DishCSV/menu_workflow.yw', 'Dish.csv', 'Dish-cleaned.csv'),
+}
+
+ON_ERROR = ('keep-original', 'set-to-blank', 'store-error')
+
+
+class UnsupportedOperation(ValueError):
+    """An operation or expression the replay engine cannot translate."""
+
+
+class Cells:
+    """
+    A column of GREL values: each cell is null, a string or a number.
+
+    Strings live in `text` (None elsewhere) and numbers in `number` (NaN
+    elsewhere). `integral` marks numbers that are Java Longs rather than
+    Doubles, which matters for toString(). `error` holds an error message
+    per cell, or None.
+    """
+
+    def __init__(self, text, number, is_num, integral, error=None):
+        self.text = text
+        self.number = number
+        self.is_num = is_num
+        self.integral = integral
+        self.error = error if error is not None else np.full(len(text), None, dtype=object)
+
+    @classmethod
+    def from_strings(cls, values):
+        text = np.asarray(values, dtype=object)
+        n = len(text)
+        return cls(text, np.full(n, np.nan), np.zeros(n, bool), np.zeros(n, bool))
+
+    @classmethod
+    def constant(cls, value, n):
+        if isinstance(value, str):
+            return cls.from_strings(np.full(n, value, dtype=object))
+        return cls(np.full(n, None, dtype=object), np.full(n, float(value)), np.ones(n, bool),
+                   np.full(n, isinstance(value, int)))
+
+    def __len__(self):
+        return len(self.text)
+
+    def as_text(self):
+        """Strings as they are and numbers formatted as Java does; None for null."""
+        text = self.text.copy()
+        if self.is_num.any():
+            text[self.is_num] = java_number_strings(self.number[self.is_num], self.integral[self.is_num])
+        return text
+
+    def select(self, mask, other):
+        """This column where mask is true, `other` elsewhere."""
+        return Cells(np.where(mask, self.text, other.text), np.where(mask, self.number, other.number),
+                     np.where(mask, self.is_num, other.is_num), np.where(mask, self.integral, other.integral),
+                     np.where(mask, self.error, other.error))
+
+
+def _java_double(x):
+    """Double.toString(x): plain notation in [1e-3, 1e7), computerized scientific outside it."""
+    if np.isnan(x):
+        return 'NaN'
+    if np.isinf(x):
+        return 'Infinity' if x > 0 else '-Infinity'
+    if x == 0:
+        return '-0.0' if np.signbit(x) else '0.0'
+    if 1e-3 <= abs(x) < 1e7:
+        text = repr(float(x))
+        return text if '.' in text else text + '.0'
+    sign, digits, exponent = Decimal(repr(float(x))).as_tuple()
+    digits = ''.join(map(str, digits))
+    power = exponent + len(digits) - 1
+    digits = digits.rstrip('0')
+    return f"{'-' if sign else ''}{digits[0]}.{digits[1:] or '0'}E{power}"
+
+
+def java_number_strings(number, integral):
+    """Format numbers the way OpenRefine writes them, once per distinct value."""
+    out = np.empty(len(number), dtype=object)
+    for flag in (True, False):
+        mask = integral == flag
+        if mask.any():
+            uniques, inverse = np.unique(number[mask], return_inverse=True)
+            formatted = [str(int(x)) if flag else _java_double(x) for x in uniques]
+            out[mask] = np.asarray(formatted, dtype=object)[inverse]
+    return out
+
+
+# --- GREL expressions -------------------------------------------------------
+
+TOKEN = re.compile(r"""\s*(?:
+    (?P<number>\d+(?:\.\d+)?)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<regex>/(?:[^/\\]|\\.)*/)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<punct>[(),.])
+  | (?P<other>\S)
+)""", re.VERBOSE)
+
+
+def _tokenize(expression):
+    tokens, pos = [], 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = TOKEN.match(expression, pos)
+        kind = match.lastgroup
+        value = match.group(kind)
+        # GREL arithmetic isn't supported, so a slash after an operand can only be division
+        if kind == 'regex' and tokens and (tokens[-1][0] != 'punct' or tokens[-1][1] == ')'):
+            kind, value = 'other', '/'
+        if kind == 'other':
+            raise UnsupportedOperation(f"unsupported operator {value!r}")
+        pos = match.end()
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive-descent parser for the GREL subset used in the cleaning steps:
+    `value`, number/string/regex literals, function calls f(a, b) and method
+    calls a.f(b). A method call is the same as the function call f(a, b).
+    """
+
+    def __init__(self, expression):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind, value=None):
+        token = self.peek()
+        if token[0] != kind or value is not None and token[1] != value:
+            raise UnsupportedOperation(f"expected {value or kind} at token {self.pos + 1}, got {token[1]!r}")
+        self.pos += 1
+        return token[1]
+
+    def parse(self):
+        tree = self.expression()
+        if self.pos != len(self.tokens):
+            raise UnsupportedOperation(f"unexpected {self.peek()[1]!r} after a complete expression")
+        return tree
+
+    def expression(self):
+        tree = self.primary()
+        while self.peek() == ('punct', '.'):
+            self.take('punct', '.')
+            name = self.take('name')
+            tree = ('call', name, [tree] + self.arguments())
+        return tree
+
+    def primary(self):
+        kind, value = self.peek()
+        if kind == 'number':
+            self.pos += 1
+            return ('const', float(value) if '.' in value else int(value))
+        if kind == 'string':
+            self.pos += 1
+            return ('const', json.loads('"' + value[1:-1].replace('"', '\\"') + '"')
+                    if value[0] == "'" else json.loads(value))
+        if kind == 'regex':
+            self.pos += 1
+            return ('regex', value[1:-1])
+        if kind == 'name':
+            self.pos += 1
+            if value == 'value':
+                return ('value',)
+            return ('call', value, self.arguments())
+        raise UnsupportedOperation(f"unexpected {value!r}")
+
+    def arguments(self):
+        self.take('punct', '(')
+        args = []
+        if self.peek() != ('punct', ')'):
+            args.append(self.expression())
+            while self.peek() == ('punct', ','):
+                self.take('punct', ',')
+                args.append(self.expression())
+        self.take('punct', ')')
+        return args
+
+
+def _fail(result, mask, message):
+    """Set `message` on cells in mask that don't already carry an error."""
+    result.error = np.where(mask & pd.isna(result.error), message, result.error)
+    return result
+
+
+def _inherit(result, *args):
+    # Errors in arguments bubble up, first argument first
+    for arg in reversed(args):
+        result.error = np.where(pd.isna(arg.error), result.error, arg.error)
+    return result
+
+
+def _to_number(x):
+    n = len(x)
+    number, integral = x.number.copy(), x.integral.copy()
+    strings = ~x.is_num & ~pd.isna(x.text)
+    text = pd.Series(x.text[strings], dtype=object).str.strip()
+    number[strings] = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64)
+    integral[strings] = text.str.fullmatch(r'[+-]?\d+').fillna(False).to_numpy(dtype=bool)
+    is_num = x.is_num | strings & ~np.isnan(number)
+    result = Cells(np.full(n, None, dtype=object), number, is_num, integral & is_num)
+    return _inherit(_fail(result, ~is_num, 'Cannot parse to number'), x)
+
+
+def _to_string(x):
+    result = Cells.from_strings(x.as_text())
+    return _inherit(result, x)
+
+
+def _extreme(pick, name):
+    def apply(a, b):
+        both = a.is_num & b.is_num
+        result = Cells(np.full(len(a), None, dtype=object), pick(a.number, b.number), both,
+                       np.zeros(len(a), bool))
+        return _inherit(_fail(result, ~both, f"{name} expects two numbers"), a, b)
+    return apply
+
+
+def _string_function(name, transform):
+    def apply(x):
+        text = x.as_text()
+        present = ~pd.isna(text)
+        out = np.full(len(x), None, dtype=object)
+        if present.any():
+            out[present] = transform(pd.Series(text[present], dtype=object)).to_numpy(dtype=object)
+        return _inherit(_fail(Cells.from_strings(out), ~present, f"{name} expects a string"), x)
+    return apply
+
+
+def _java_replacement(replacement):
+    # Java's $1 group references become \g<1>; backslashes escape the next character
+    return re.sub(r'\\(.)|\$(\d)|(\\)', lambda m: re.escape(m.group(1)) if m.group(1) else
+                  rf'\g<{m.group(2)}>' if m.group(2) else r'\\', replacement)
+
+
+def _title_case(text):
+    # WordUtils.capitalizeFully: lower-case everything, then upper-case the
+    # first character after each whitespace run
+    return text.str.lower().str.replace(r'(^|\s)(\S)', lambda m: m.group(1) + m.group(2).upper(), regex=True)
+
+
+JAVA_WHITESPACE = ''.join(map(chr, range(33)))
+
+STRING_FUNCTIONS = {
+    'trim': lambda s: s.str.strip(JAVA_WHITESPACE),
+    'toLowercase': lambda s: s.str.lower(),
+    'toUppercase': lambda s: s.str.upper(),
+    'toTitlecase': _title_case,
+}
+
+
+def _compile(tree):
+    """Turn a parsed expression into a function of the `value` column."""
+    kind = tree[0]
+    if kind == 'value':
+        return lambda value: value
+    if kind == 'const':
+        return lambda value: Cells.constant(tree[1], len(value))
+    if kind == 'regex':
+        raise UnsupportedOperation("a regex literal is only supported as replace()'s pattern")
+
+    name, args = tree[1], tree[2]
+    if name == 'replace':
+        if len(args) != 3 or args[1][0] not in ('const', 'regex') or args[2][0] != 'const':
+            raise UnsupportedOperation("replace() needs a literal pattern and replacement")
+        subject = _compile(args[0])
+        pattern, replacement = args[1][1], str(args[2][1])
+        if args[1][0] == 'regex':
+            try:
+                # Java's \w, \s and \d are ASCII-only: /[^\w\s]/ strips "é" from "Café"
+                regex = re.compile(pattern, re.ASCII)
+            except re.error as e:
+                raise UnsupportedOperation(f"regex /{pattern}/ is not valid in Python: {e}")
+            transform = lambda s: s.str.replace(regex, _java_replacement(replacement), regex=True)
+        else:
+            transform = lambda s: s.str.replace(str(pattern), replacement, regex=False)
+        apply = _string_function('replace', transform)
+        return lambda value: apply(subject(value))
+
+    arity = {'toNumber': 1, 'toString': 1, 'max': 2, 'min': 2, **{f: 1 for f in STRING_FUNCTIONS}}
+    if name not in arity:
+        raise UnsupportedOperation(f"function {name}() is not supported")
+    if len(args) != arity[name]:
+        raise UnsupportedOperation(f"{name}() takes {arity[name]} argument(s), got {len(args)}")
+    parts = [_compile(arg) for arg in args]
+    apply = {'toNumber': _to_number, 'toString': _to_string,
+             'max': _extreme(np.maximum, 'max'), 'min': _extreme(np.minimum, 'min')}.get(name) \
+        or _string_function(name, STRING_FUNCTIONS[name])
+    return lambda value: apply(*[part(value) for part in parts])
+
+
+def compile_expression(expression):
+    """Compile an OpenRefine expression; only GREL (optionally `grel:`-prefixed) is supported."""
+    language, _, body = expression.partition(':')
+    if not _ or not re.fullmatch(r'[a-z]+', language):
+        body = expression
+    elif language != 'grel':
+        raise UnsupportedOperation(f"{language} expressions are not supported")
+    return _compile(_Parser(body).parse())
+
+
+# --- Operations -------------------------------------------------------------
+
+def _text_transform(op):
+    if op.get('engineConfig', {}).get('facets'):
+        raise UnsupportedOperation("faceted (row-filtered) transforms are not supported")
+    on_error = op.get('onError', 'keep-original')
+    if on_error not in ON_ERROR:
+        raise UnsupportedOperation(f"unknown onError {on_error!r}")
+    evaluate = compile_expression(op['expression'])
+    repeat = op.get('repeatCount', 10) if op.get('repeat') else 1
+
+    def apply(cells):
+        errors = 0
+        for _ in range(repeat):
+            result = evaluate(cells)
+            failed = ~pd.isna(result.error)
+            errors = int(failed.sum())
+            if on_error == 'keep-original':
+                updated = result.select(~failed, cells)
+            elif on_error == 'set-to-blank':
+                updated = result.select(~failed, Cells.from_strings(np.full(len(cells), None, dtype=object)))
+            else:
+                updated = result.select(~failed, Cells.from_strings(result.error))
+            updated.error = np.full(len(cells), None, dtype=object)
+            unchanged = np.array_equal(updated.as_text(), cells.as_text())
+            cells = updated
+            if unchanged:
+                break
+        return cells, errors
+    return apply
+
+
+def _mass_edit(op):
+    if 'edits' not in op:
+        raise UnsupportedOperation("the workflow file does not record the edit list")
+    if op.get('expression', 'value') != 'value' or op.get('engineConfig', {}).get('facets'):
+        raise UnsupportedOperation("only unfaceted mass edits of `value` are supported")
+    mapping, blank_to = {}, None
+    for edit in op['edits']:
+        mapping.update({source: edit['to'] for source in edit.get('from', [])})
+        if edit.get('fromBlank'):
+            blank_to = edit['to']
+
+    def apply(cells):
+        text = pd.Series(cells.as_text(), dtype=object)
+        edited = text.map(mapping)
+        hit = edited.notna().to_numpy()
+        out = np.where(hit, edited.to_numpy(dtype=object), text.to_numpy(dtype=object))
+        if blank_to is not None:
+            blank = pd.isna(text).to_numpy() | (text == '').to_numpy()
+            out[blank] = blank_to
+            hit |= blank
+        return cells.select(~hit, Cells.from_strings(out)), 0
+    return apply
+
+
+OPERATIONS = {
+    'core/text-transform': _text_transform,
+    'core/mass-edit': _mass_edit,
+}
+
+
+def load_history(path):
+    """
+    Operations from an OpenRefine history.json (exported operation list) or
+    a YesWorkflow .yw file. The .yw form records only the operation name,
+    column and expression, so its text transforms get OpenRefine's default
+    onError of keep-original.
+    """
+    if not path.endswith('.yw'):
+        with open(path) as f:
+            return json.load(f)
+
+    ops = []
+    with open(path) as f:
+        for line in f:
+            match = re.match(r'#@begin (core/[a-z-]+?)\d*#@desc (.*)$', line.rstrip('\n'))
+            if not match:
+                continue
+            op, description = match.group(1), re.sub(r'\\(.)', r'\1', match.group(2))
+            entry = {'op': op, 'description': description}
+            transform = re.match(r'Text transform on cells in column (.+?) using expression (.*)$', description)
+            edit = re.match(r'Mass edit cells in column (.+)$', description)
+            if transform:
+                entry.update(columnName=transform.group(1), expression=transform.group(2),
+                             onError='keep-original')
+            elif edit:
+                entry.update(columnName=edit.group(1))
+            ops.append(entry)
+    return ops
+
+
+def compile_history(ops):
+    """
+    Split operations into those the engine can apply and those it can't.
+
+    Returns ([(index, op, apply)], [(index, op, reason)]). apply(cells)
+    returns (new cells, number of cells whose evaluation failed).
+    """
+    steps, skipped = [], []
+    for i, op in enumerate(ops, 1):
+        try:
+            build = OPERATIONS.get(op.get('op'))
+            if build is None:
+                raise UnsupportedOperation(f"operation {op.get('op')} is not supported")
+            steps.append((i, op, build(op)))
+        except UnsupportedOperation as e:
+            skipped.append((i, op, str(e)))
+    return steps, skipped
+
+
+def replay(history_path, input_path, output_path, chunksize=200_000):
+    """
+    Apply an OpenRefine history to a CSV, streaming it in chunks.
+
+    Cells are read as text, with empty cells as null, as OpenRefine imports
+    them. Each supported operation runs as a column-wide vectorized
+    transform, respecting its onError setting. Operations that can't be
+    translated are skipped and reported. The output is written to a
+    temporary file and moved into place at the end. Returns the per-step
+    error counts and the skipped operations.
+    """
+    steps, skipped = compile_history(load_history(history_path))
+    header = pd.read_csv(input_path, nrows=0).columns
+    missing = {op['columnName'] for _, op, _ in steps} - set(header)
+    if missing:
+        raise ValueError(f"{input_path} has no column(s) {sorted(missing)}")
+
+    start = time.perf_counter()
+    tmp_path = output_path + '.building'
+    errors = {i: 0 for i, _, _ in steps}
+    rows = 0
+    chunks = pd.read_csv(input_path, chunksize=chunksize, dtype=str, keep_default_na=False, na_values=[''])
+    for n, chunk in enumerate(chunks):
+        columns = {}
+        for i, op, apply in steps:
+            name = op['columnName']
+            cells = columns.get(name)
+            if cells is None:
+                cells = Cells.from_strings(chunk[name].to_numpy(dtype=object, na_value=None))
+            columns[name], failed = apply(cells)
+            errors[i] += failed
+        for name, cells in columns.items():
+            chunk[name] = cells.as_text()
+        chunk.to_csv(tmp_path, mode='w' if n == 0 else 'a', header=n == 0, index=False)
+        rows += len(chunk)
+    if not rows:
+        # A header with no data rows yields no chunks; keep the header
+        pd.DataFrame(columns=header).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    elapsed = time.perf_counter() - start
+
+    print(f"Replayed {os.path.basename(history_path)} on {input_path}: {rows:,} rows "
+          f"in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s) -> {output_path}")
+    for i, op, _ in steps:
+        print(f"  {i:>2}. applied  {op['columnName']}: {op.get('expression', op['op'])} "
+              f"({errors[i]:,} cells failed, {op.get('onError', 'keep-original')})")
+    for i, op, reason in skipped:
+        print(f"  {i:>2}. SKIPPED  {op.get('description', op.get('op'))}: {reason}")
+    return errors, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay OpenRefine cleaning histories on the raw CSVs")
+    parser.add_argument('tables', nargs='*', metavar='TABLE',
+                        help=f"recorded workflow(s) to replay: {', '.join(sorted(WORKFLOWS))} (default: all)")
+    parser.add_argument('--history', help="replay this history file instead of a recorded workflow")
+    parser.add_argument('--input')
+    parser.add_argument('--output')
+    parser.add_argument('--chunksize', type=int, default=200_000)
+    args = parser.parse_args()
+    unknown = set(args.tables) - set(WORKFLOWS)
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(sorted(unknown))}")
+
+    if args.history:
+        replay(args.history, args.input, args.output, args.chunksize)
+    else:
+        for table in args.tables or sorted(WORKFLOWS):
+            replay(*WORKFLOWS[table], chunksize=args.chunksize)
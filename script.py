@@ -1,75 +1,111 @@
+import argparse
+
 import pandas as pd
 import sqlite3
-import numpy as np
-
-def main():
-
-    print("What's on The Menu? Dish Analysis")
-    print("=" * 55)
 
-    conn = sqlite3.connect(':memory:')
+from catalog_topn import catalog_top_n
+from decade_stats import print_rankings, rank_dishes
+from dish_extract import extract_detailed
+from dish_clusters import CLUSTERS_PATH, canonical_dishes, canonical_ids, load_mapping
+import incremental
+from profiling import TRACE_ENV, begin, enable, finish, rows, stage
+from sqlite_store import create_table, open_store
+from streaming_join import add_date_columns, stream_detailed_data, top_dishes_frame
+from table_schemas import load_source
 
-    menu_df = pd.read_csv('Menu.csv')
-    menupage_df = pd.read_csv('MenuPage.csv')
-    menuitem_df = pd.read_csv('MenuItem-cleaned.csv')
-    dish_df = pd.read_csv('Dish-cleaned.csv')
-
-    menu_df.to_sql('Menu', conn, index=False)
-    menupage_df.to_sql('MenuPage', conn, index=False)
-    menuitem_df.to_sql('MenuItem', conn, index=False)
-    dish_df.to_sql('Dish', conn, index=False)
-    
-    print(f"Loaded {len(menu_df):,} menus, {len(menuitem_df):,} menu items, {len(dish_df):,} dishes")
-    
-    top_dishes_query = """
+TOP_DISHES_QUERY = """
     SELECT id, name, times_appeared, menus_appeared
     FROM Dish 
     WHERE times_appeared > 0
     ORDER BY times_appeared DESC 
     LIMIT 5
     """
+
+
+def main(db_path=None, streaming=False, clusters=None, incremental_state=None):
+
+    print("What's on The Menu? Dish Analysis")
+    print("=" * 55)
+    begin('main')
+    stage('load')
+    dish_map = load_mapping(clusters) if clusters else None
+
+    if incremental_state:
+        # Only rows appended since the last run are parsed; see incremental.py
+        incremental.refresh(incremental_state)
+        fact = incremental.load_fact(incremental_state)
+        dish_df = load_source('Dish')
+        print(f"Loaded {len(dish_df):,} dishes, {len(fact):,} joined menu items (incremental)")
+        rows(len(dish_df) + len(fact))
+        if dish_map is not None:
+            dish_df = canonical_dishes(dish_df, dish_map)
+            print(f"Counting by canonical dish: {len(dish_df):,} dishes after consolidation ({clusters})")
+    elif streaming:
+        # MenuItem is never loaded whole; see streaming_join.py
+        menu_df = load_source('Menu')
+        menupage_df = load_source('MenuPage')
+        dish_df = load_source('Dish')
+        print(f"Loaded {len(menu_df):,} menus, {len(dish_df):,} dishes (menu items streamed)")
+        rows(len(menu_df) + len(menupage_df) + len(dish_df))
+        if dish_map is not None:
+            dish_df = canonical_dishes(dish_df, dish_map)
+            print(f"Counting by canonical dish: {len(dish_df):,} dishes after consolidation ({clusters})")
+    else:
+        if db_path:
+            # Persistent indexed store built by sqlite_store.py
+            conn = open_store(db_path)
+            n_menus, n_items, n_dishes = (conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                                          for table in ('Menu', 'MenuItem', 'Dish'))
+        else:
+            conn = sqlite3.connect(':memory:')
+
+            menu_df = load_source('Menu')
+            menupage_df = load_source('MenuPage')
+            menuitem_df = load_source('MenuItem')
+            dish_df = load_source('Dish')
+            n_menus, n_items, n_dishes = len(menu_df), len(menuitem_df), len(dish_df)
+            rows(n_menus + len(menupage_df) + n_items + n_dishes)
+            if dish_map is not None:
+                dish_df = canonical_dishes(dish_df, dish_map)
+                menuitem_df = menuitem_df.assign(dish_id=canonical_ids(menuitem_df['dish_id'], dish_map))
+
+            stage('to_sql')
+            menu_df = add_date_columns(menu_df)
+            menu_df.to_sql('Menu', conn, index=False)
+            menupage_df.to_sql('MenuPage', conn, index=False)
+            # The table adds the stored avg_price column
+            create_table(conn, 'MenuItem', menuitem_df, primary_key=False)
+            menuitem_df.to_sql('MenuItem', conn, if_exists='append', index=False)
+            dish_df.to_sql('Dish', conn, index=False)
+            rows(len(menu_df) + len(menupage_df) + len(menuitem_df) + len(dish_df))
+        print(f"Loaded {n_menus:,} menus, {n_items:,} menu items, {n_dishes:,} dishes")
+        if dish_map is not None:
+            print(f"Counting by canonical dish: {len(dish_df):,} dishes after consolidation ({clusters})")
     
-    top_dishes = pd.read_sql_query(top_dishes_query, conn)
+    stage('top_dishes')
+    if streaming or incremental_state:
+        top_dishes = top_dishes_frame(dish_df)
+    else:
+        top_dishes = pd.read_sql_query(TOP_DISHES_QUERY, conn)
+    rows(len(top_dishes))
     print("Top 5 dishes:")
     for i, row in top_dishes.iterrows():
         print(f"   {i+1}. {row['name']:<20} ({row['times_appeared']:,} times)")
     
     print("\nExtracting detailed data for analysis...")
-    dish_ids = top_dishes['id'].tolist()
-    dish_ids_str = ','.join(map(str, dish_ids))
-    
-    detailed_query = f"""
-    SELECT 
-        d.id as dish_id,
-        d.name as dish_name,
-        mi.price,
-        mi.high_price,
-        CASE 
-            WHEN mi.high_price IS NOT NULL AND mi.high_price > 0 
-            THEN (CAST(mi.price AS REAL) + CAST(mi.high_price AS REAL)) / 2.0
-            ELSE CAST(mi.price AS REAL)
-        END as avg_price,
-        m.date,
-        CAST(strftime('%Y', m.date) AS INTEGER) as year,
-        (CAST(strftime('%Y', m.date) AS INTEGER) / 10) * 10 as decade,
-        m.location,
-        m.venue
-    FROM MenuItem mi
-    JOIN MenuPage mp ON mi.menu_page_id = mp.id
-    JOIN Menu m ON mp.menu_id = m.id  
-    JOIN Dish d ON mi.dish_id = d.id
-    WHERE mi.dish_id IN ({dish_ids_str})
-        AND m.date IS NOT NULL
-        AND strftime('%Y', m.date) BETWEEN '1850' AND '2020'
-    ORDER BY d.times_appeared DESC, m.date
-    """
-    
-    analysis_data = pd.read_sql_query(detailed_query, conn)
-    conn.close()
-    
-    # Save the final cleaned dataset
+    stage('detailed_join')
     final_dataset = 'final_cleaned_dataset.csv'
-    analysis_data.to_csv(final_dataset, index=False)
+    if incremental_state:
+        analysis_data = incremental.detailed_data(top_dishes, fact, final_dataset, dish_map=dish_map)
+    elif streaming:
+        analysis_data, rows_scanned = stream_detailed_data(top_dishes, menu_df, menupage_df, final_dataset,
+                                                           dish_map=dish_map)
+        print(f"Scanned {rows_scanned:,} menu items")
+    else:
+        # Rows are written to the final cleaned dataset as they stream out
+        analysis_data = extract_detailed(conn, top_dishes['id'], final_dataset)
+        conn.close()
+    rows(len(analysis_data))
     print(f"Final cleaned dataset saved to: {final_dataset}")
     
     print(f"\nDataset summary:")
@@ -80,49 +116,73 @@ def main():
     print(f"\nTop 5 Dishes by Decade")
     print("=" * 55)
     
+    stage('decade_aggregation')
     df = analysis_data[(analysis_data['decade'] >= 1850) & (analysis_data['decade'] <= 2020)]
+    rows(len(df))
     
     print(f"Dataset: {len(df):,} records across {df['decade'].nunique()} decades")
     print(f"Price data: {df['avg_price'].notna().sum():,} records ({100*df['avg_price'].notna().mean():.1f}%)")
     
-    results = []
-    
-    for decade in sorted(df['decade'].unique()):
-        decade_data = df[df['decade'] == decade]
-        
-        # Count frequency and calculate median price for each dish
-        dish_stats = decade_data.groupby('dish_name').agg({
-            'dish_id': 'count',  # frequency
-            'avg_price': lambda x: np.median(x.dropna()) if x.notna().any() else None
-        }).rename(columns={'dish_id': 'frequency', 'avg_price': 'median_price'})
-        
-        # Get top 5 by frequency
-        top_5 = dish_stats.nlargest(5, 'frequency')
-        
-        for rank, (dish_name, row) in enumerate(top_5.iterrows(), 1):
-            results.append({
-                'decade': int(decade),
-                'rank': rank,
-                'dish_name': dish_name,
-                'frequency': row['frequency'],
-                'median_price': row['median_price']
-            })
-    
-    results_df = pd.DataFrame(results)
-    
-    for decade in sorted(results_df['decade'].unique()):
-        decade_results = results_df[results_df['decade'] == decade]
-        total_records = len(df[df['decade'] == decade])
-
-        print(f"{decade}s ({total_records:,} total records):")
-        print("   " + "-" * 45)
-        
-        for _, row in decade_results.iterrows():
-            price_str = f"${row['median_price']:.2f}" if pd.notna(row['median_price']) else "No price"
-            freq_pct = 100 * row['frequency'] / total_records
-            print(f"   {row['rank']}. {row['dish_name']:<15} {row['frequency']:>4}x ({freq_pct:4.1f}%) - {price_str}")
+    # Counts, shares, median prices and ranks for every (decade, dish) at once
+    results_df = rank_dishes(df, n=5)
+    print_rankings(results_df)
+    finish()
+
+    return results_df
+
+
+def main_full_catalog(n=5, clusters=None, incremental_state=None):
+    """Rank every dish in the catalog per decade, not just the global top 5."""
+
+    print("What's on The Menu? Dish Analysis (full catalog)")
+    print("=" * 55)
+    begin('full_catalog')
+    stage('catalog_scan')
+
+    dish_map = load_mapping(clusters) if clusters else None
+    if incremental_state:
+        incremental.refresh(incremental_state)
+        results_df = incremental.catalog_top_n(n=n, dish_map=dish_map, state_dir=incremental_state)
+    else:
+        results_df = catalog_top_n(n=n, dish_map=dish_map)
+
+    print(f"\nTop {n} Dishes by Decade")
+    print("=" * 55)
+    print(f"Dataset: {results_df.drop_duplicates('decade')['bucket_total'].sum():,} records "
+          f"across {results_df['decade'].nunique()} decades")
+    rows(len(results_df))
+    print_rankings(results_df)
+    finish()
 
     return results_df
 
+
 if __name__ == "__main__":
-    results = main()
+    parser = argparse.ArgumentParser(description="Top dishes and median prices per decade")
+    parser.add_argument('--db', metavar='PATH',
+                        help="read from a persistent store built by sqlite_store.py instead of an in-memory database")
+    parser.add_argument('--streaming', action='store_true',
+                        help="stream MenuItem-cleaned.csv in chunks instead of loading it into SQLite")
+    parser.add_argument('--full-catalog', action='store_true',
+                        help="rank all dishes per decade instead of re-ranking the global top 5")
+    parser.add_argument('--clusters', metavar='PATH', nargs='?', const=CLUSTERS_PATH,
+                        help="count and rank by canonical dish using a mapping from dish_clusters.py "
+                             f"(default {CLUSTERS_PATH})")
+    parser.add_argument('--incremental', metavar='DIR', nargs='?', const=incremental.STATE_DIR,
+                        help="ingest only rows appended since the last run, keeping the joined fact table and "
+                             f"decade aggregates in DIR (default {incremental.STATE_DIR})")
+    parser.add_argument('--trace', metavar='PATH', nargs='?', const='trace.json',
+                        help="write per-stage wall time, CPU time, peak RSS and row counts to a JSON trace "
+                             f"(default trace.json; or set {TRACE_ENV}=PATH)")
+    args = parser.parse_args()
+    if args.trace:
+        enable(args.trace)
+    if args.incremental and (args.db or args.streaming):
+        parser.error("--incremental cannot be combined with --db or --streaming")
+    if args.clusters and args.db:
+        parser.error("--clusters needs the in-memory or --streaming path; menu.db stores raw dish ids")
+    if args.full_catalog:
+        results = main_full_catalog(clusters=args.clusters, incremental_state=args.incremental)
+    else:
+        results = main(db_path=args.db, streaming=args.streaming, clusters=args.clusters,
+                       incremental_state=args.incremental)
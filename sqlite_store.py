@@ -0,0 +1,133 @@
+import os
+import pathlib
+import sqlite3
+import time
+
+import pandas as pd
+
+from streaming_join import add_date_columns
+from table_schemas import SOURCE_FILES, load_source
+
+DB_PATH = 'menu.db'
+
+# Menu's date is parsed once, vectorized, into integer year/decade columns,
+# so queries filter on an indexable integer range instead of strftime
+DERIVED_COLUMNS = {
+    'Menu': add_date_columns,
+}
+
+# Columns SQLite computes once per row as it is inserted (STORED), so they
+# add no Python-side insert cost. avg_price is the midpoint of a price
+# range, else the price, the same as streaming_join.avg_prices.
+GENERATED_COLUMNS = {
+    'MenuItem': {
+        'avg_price': 'REAL GENERATED ALWAYS AS (CASE WHEN high_price IS NOT NULL AND high_price > 0 '
+                     'THEN (CAST(price AS REAL) + CAST(high_price AS REAL)) / 2.0 '
+                     'ELSE CAST(price AS REAL) END) STORED',
+    },
+}
+
+# Secondary indexes on the join and filter columns of the detailed query.
+# Every table's `id` is its INTEGER PRIMARY KEY (the rowid), so the
+# MenuPage.id / Menu.id / Dish.id lookups need no extra index.
+INDEXES = {
+    'idx_menuitem_dish': 'MenuItem (dish_id, menu_page_id)',
+    'idx_menuitem_page': 'MenuItem (menu_page_id)',
+    'idx_menupage_menu': 'MenuPage (menu_id)',
+    'idx_menu_year': 'Menu (year)',
+    'idx_dish_times': 'Dish (times_appeared)',
+}
+
+
+def _sql_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def create_table(conn, name, df, primary_key=True):
+    """
+    Create table `name` with df's columns and the table's GENERATED_COLUMNS.
+
+    With primary_key, `id` becomes the INTEGER PRIMARY KEY (the rowid).
+    Fill it with df.to_sql(name, conn, if_exists='append', index=False).
+    """
+    columns = []
+    for column, dtype in df.dtypes.items():
+        if column == 'id' and primary_key:
+            columns.append('"id" INTEGER PRIMARY KEY')
+        else:
+            columns.append(f'"{column}" {_sql_type(dtype)}')
+    for column, definition in GENERATED_COLUMNS.get(name, {}).items():
+        columns.append(f'"{column}" {definition}')
+    conn.execute(f'CREATE TABLE "{name}" ({", ".join(columns)})')
+
+
+def build_store(db_path=DB_PATH, tables=SOURCE_FILES):
+    """
+    Build a persistent, indexed SQLite database from the source CSVs.
+
+    The database is written to a temporary file and moved into place once
+    the indexes and planner statistics are complete, so readers never see a
+    partially built store. Returns the build time in seconds and the file
+    size in bytes.
+    """
+    start = time.perf_counter()
+    tmp_path = db_path + '.building'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        for name, csv_path in tables.items():
+            df = load_source(name, csv_path)
+            if name in DERIVED_COLUMNS:
+                df = DERIVED_COLUMNS[name](df)
+            create_table(conn, name, df)
+            try:
+                df.to_sql(name, conn, if_exists='append', index=False, chunksize=100_000)
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"{csv_path} has duplicate or missing ids: {e}") from e
+            print(f"  {name}: {len(df):,} rows")
+        for index_name, definition in INDEXES.items():
+            conn.execute(f'CREATE INDEX {index_name} ON {definition}')
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(db_path)
+    print(f"Built {db_path}: {size / 1e6:.1f} MB in {elapsed:.1f}s")
+    return elapsed, size
+
+
+def open_store(db_path=DB_PATH):
+    """Open an existing store read-only."""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"{db_path} not found; build it with `python sqlite_store.py {db_path}`")
+    uri = pathlib.Path(db_path).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True)
+    menu_columns = {row[1] for row in conn.execute('PRAGMA table_info(Menu)')}
+    if 'year' not in menu_columns:
+        conn.close()
+        raise ValueError(f"{db_path} predates the stored year/decade/avg_price columns; "
+                         f"rebuild it with `python sqlite_store.py {db_path}`")
+    return conn
+
+
+def explain(conn, query):
+    """Return SQLite's query plan for query, one step per line."""
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {query}').fetchall()
+    return '\n'.join(row[-1] for row in rows)
+
+
+if __name__ == "__main__":
+    import sys
+
+    build_store(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
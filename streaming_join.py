@@ -0,0 +1,190 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from dish_clusters import canonical_ids
+from parallel_csv import DEFAULT_WORKERS, MIN_PARALLEL_BYTES, iter_csv_parallel
+from table_schemas import read_options
+
+OUTPUT_COLUMNS = ['dish_id', 'dish_name', 'price', 'high_price', 'avg_price',
+                  'date', 'year', 'decade', 'location', 'venue']
+
+# Date strings SQLite's strftime('%Y', ...) accepts: YYYY-MM-DD with an
+# optional time of day and timezone suffix
+SQLITE_DATE = (r'^(\d{4})-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12]\d|3[01])'
+               r'(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?\s*(?:Z|[+-]\d{2}:\d{2})?\s*$')
+
+
+def menu_years(dates):
+    """
+    Vectorized strftime('%Y', date) for a Series of date strings.
+
+    Returns a float Series holding the year, or NaN where SQLite would
+    return NULL (missing or malformed dates).
+    """
+    years = dates.astype(object).where(dates.notna()).astype(str).str.extract(SQLITE_DATE, expand=False)
+    return pd.to_numeric(years, errors='coerce').where(dates.notna())
+
+
+def add_date_columns(menu_df):
+    """
+    Menu with its date parsed once into integer year and decade columns.
+
+    year/decade are nullable integers, null where strftime('%Y', date)
+    would be NULL. invalid_date flags dates that are present but
+    unparseable. Queries can then filter on `year BETWEEN 1850 AND 2020`
+    (an indexable integer range) instead of calling strftime per row.
+    """
+    years = menu_years(menu_df['date'])
+    year = years.astype('Int16')
+    return menu_df.assign(year=year, decade=year // 10 * 10,
+                          invalid_date=menu_df['date'].notna() & years.isna())
+
+
+def top_dishes_frame(dish_df, n=5):
+    """DataFrame equivalent of TOP_DISHES_QUERY in script.py."""
+    dishes = dish_df.loc[dish_df['times_appeared'] > 0, ['id', 'name', 'times_appeared', 'menus_appeared']]
+    return dishes.sort_values('times_appeared', ascending=False, kind='stable').head(n).reset_index(drop=True)
+
+
+def menu_lookup(menu_df, min_year=1850, max_year=2020):
+    """Menu id -> (date, year, decade, location, venue) for menus in the year range."""
+    years = menu_years(menu_df['date'])
+    keep = years.between(min_year, max_year)
+    menus = pd.DataFrame({
+        'date': menu_df['date'][keep].to_numpy(dtype=object),
+        'year': years[keep].to_numpy(dtype=np.int64),
+        'location': menu_df['location'][keep].to_numpy(),
+        'venue': menu_df['venue'][keep].to_numpy(),
+    }, index=pd.Index(menu_df['id'][keep].to_numpy()))
+    menus['decade'] = menus['year'] // 10 * 10
+    return menus
+
+
+def page_lookup(menupage_df):
+    """MenuPage id -> menu_id, with missing menu ids as NaN."""
+    return menupage_df.set_index('id')['menu_id'].astype('float64')
+
+
+def avg_prices(price, high_price):
+    """The detailed query's avg_price: the midpoint of a price range, else the price."""
+    price = np.asarray(price, dtype=np.float64)
+    high_price = np.asarray(high_price, dtype=np.float64)
+    return np.where(high_price > 0, (price + high_price) / 2.0, price)
+
+
+def join_menus(chunk, page_menu, menus):
+    """
+    Hash-join MenuItem rows to their menu through the two lookups.
+
+    Returns the rows that reach a menu in `menus` and the matching menu
+    rows, aligned position by position.
+    """
+    page_pos = page_menu.index.get_indexer(chunk['menu_page_id'])
+    menu_ids = page_menu.to_numpy()[np.maximum(page_pos, 0)]
+    menu_pos = menus.index.get_indexer(menu_ids)
+    hit = (page_pos >= 0) & (menu_pos >= 0)
+    return chunk[hit], menus.iloc[menu_pos[hit]]
+
+
+def iter_menu_items(menuitem_path='MenuItem-cleaned.csv', chunksize=200_000, workers=None):
+    """
+    Read MenuItem's schema columns in chunks of about `chunksize` rows.
+
+    With more than one worker (default: parallel_csv.DEFAULT_WORKERS), the
+    chunks are byte ranges parsed on a process pool.
+    """
+    workers = workers or DEFAULT_WORKERS
+    if workers > 1 and os.path.getsize(menuitem_path) >= MIN_PARALLEL_BYTES:
+        return iter_csv_parallel(menuitem_path, workers, chunksize, **read_options('MenuItem'))
+    return pd.read_csv(menuitem_path, chunksize=chunksize, **read_options('MenuItem'))
+
+
+def _join_chunk(chunk, dishes, page_menu, menus):
+    chunk = chunk[chunk['dish_id'].isin(dishes.index)]
+    if chunk.empty:
+        return None
+
+    chunk, menu = join_menus(chunk, page_menu, menus)
+    if chunk.empty:
+        return None
+    dish = dishes.iloc[dishes.index.get_indexer(chunk['dish_id'])]
+
+    price = chunk['price'].to_numpy(dtype=np.float64)
+    high_price = chunk['high_price'].to_numpy(dtype=np.float64)
+
+    return pd.DataFrame({
+        'dish_id': dish.index.to_numpy(),
+        'dish_name': dish['name'].to_numpy(),
+        'price': price,
+        'high_price': high_price,
+        'avg_price': avg_prices(price, high_price),
+        'date': menu['date'].to_numpy(),
+        'year': menu['year'].to_numpy(),
+        'decade': menu['decade'].to_numpy(),
+        'location': menu['location'].to_numpy(),
+        'venue': menu['venue'].to_numpy(),
+        # sort keys, dropped before writing
+        '_times': dish['times_appeared'].to_numpy(),
+        '_item_id': chunk['id'].to_numpy(),
+    })
+
+
+def stream_detailed_data(top_dishes, menu_df, menupage_df, output_path,
+                         menuitem_path='MenuItem-cleaned.csv', chunksize=200_000, write_chunksize=50_000,
+                         dish_map=None):
+    """
+    Streaming replacement for dish_extract.extract_detailed.
+
+    MenuItem is read in chunks of `chunksize` rows and filtered to the
+    selected dishes straight away. Each surviving row is hash-joined
+    against two small lookup maps: MenuPage (id -> menu_id) and Menu
+    (id -> date, location, venue), restricted to 1850-2020. Only the
+    selected rows are kept, so peak memory depends on the size of the
+    result, not on the size of MenuItem.
+
+    The rows are sorted exactly as the SQL query orders them (times_appeared
+    DESC, date, item id) and written to output_path in pieces. The file is
+    byte-identical to the SQL path's output. With a dish_map (see
+    dish_clusters.load_mapping), menu items are counted under their
+    canonical dish.
+    Returns the joined rows and the number of MenuItem rows scanned.
+    """
+    dishes = top_dishes.set_index('id')[['name', 'times_appeared']]
+    page_menu = page_lookup(menupage_df)
+    menus = menu_lookup(menu_df)
+
+    parts = []
+    rows_scanned = 0
+    for chunk in iter_menu_items(menuitem_path, chunksize):
+        rows_scanned += len(chunk)
+        if dish_map is not None:
+            chunk = chunk.assign(dish_id=canonical_ids(chunk['dish_id'], dish_map))
+        joined = _join_chunk(chunk, dishes, page_menu, menus)
+        if joined is not None:
+            parts.append(joined)
+
+    data = sort_detailed(parts)
+    write_detailed(data, output_path, write_chunksize)
+    return data, rows_scanned
+
+
+def sort_detailed(parts):
+    """
+    Concatenate joined pieces and order them like the detailed query:
+    times_appeared DESC, date, item id. Returns OUTPUT_COLUMNS only.
+    """
+    if not parts:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    data = pd.concat(parts, ignore_index=True)
+    data['_times'] = -data['_times']
+    data = data.sort_values(['_times', 'date', '_item_id'], kind='stable', ignore_index=True)
+    return data[OUTPUT_COLUMNS]
+
+
+def write_detailed(data, output_path, write_chunksize=50_000):
+    """Write the analysis rows to CSV in pieces of write_chunksize rows."""
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        for start in range(0, max(len(data), 1), write_chunksize):
+            data.iloc[start:start + write_chunksize].to_csv(f, header=start == 0, index=False)
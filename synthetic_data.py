@@ -0,0 +1,290 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from refine_replay import WORKFLOWS, replay
+
+# Table sizes of the real NYPL export; scale=1 reproduces them
+REAL_SIZES = {'Menu': 17_545, 'MenuPage': 66_937, 'MenuItem': 1_332_726, 'Dish': 423_397}
+MENU_ID_START, PAGE_ID_START = 12_463, 119
+CHUNK_ROWS = 1_000_000
+
+# Dish popularity: weight of the dish ranked r is (r + POP_OFFSET) ** -POP_EXPONENT.
+# Fitted so the top dish takes ~0.6% of menu items and the 5th ~0.25%, and
+# the long tail appears once or never, as in the real Dish.times_appeared
+POP_EXPONENT = 0.78
+POP_OFFSET = 1.67
+PRICE_COVERAGE = 0.25
+RANGE_SHARE = 0.06  # priced items listed as a low-high range
+
+# The most popular dishes, by rank; every 7th later dish is a spelling
+# variant (case, spacing, punctuation) of a more popular one
+HEAD = [
+    'Coffee', 'Tea', 'Celery', 'Olives', 'Radishes', 'Mashed potatoes', 'Boiled potatoes', 'Chicken salad',
+    'Lettuce', 'Vanilla ice cream', 'Sliced tomatoes', 'Potato salad', 'Milk', 'Roquefort', 'Oranges',
+    'Cocoa', 'Apple pie', 'Green peas', 'Hot chocolate', 'Lobster salad', 'Consomme', 'Stewed tomatoes',
+    'Ice cream', 'Baked potatoes', 'French fried potatoes', 'Chocolate ice cream', 'Clam chowder',
+    'Cafe noir', 'Sardines', 'Pickles', 'Strawberries', 'Boiled ham', 'Tomato salad', 'Cream cheese',
+    'Apple sauce', 'Lamb chops', 'Spring chicken', 'Sirloin steak', 'Fresh mushrooms', 'Hominy',
+]
+PREPARATIONS = ['', 'Boiled', 'Fried', 'Broiled', 'Roast', 'Stewed', 'Baked', 'Grilled', 'Braised', 'Smoked',
+                'Creamed', 'Deviled', 'Sauteed', 'Poached', 'Fresh', 'Cold', 'Hot', 'Stuffed', 'Pickled',
+                'Curried', 'Minced', 'Scalloped', 'Breaded', 'Glazed', 'Jellied', 'Spiced', 'Iced', 'Hashed',
+                'Young', 'Imported', 'Domestic', 'Small', 'Whole', 'Half']
+FOODS = ['Chicken', 'Duck', 'Turkey', 'Goose', 'Squab', 'Quail', 'Beef', 'Veal', 'Lamb', 'Mutton', 'Pork',
+         'Ham', 'Bacon', 'Sausage', 'Tongue', 'Sweetbreads', 'Kidneys', 'Liver', 'Salmon', 'Halibut', 'Bluefish',
+         'Shad', 'Trout', 'Sole', 'Codfish', 'Mackerel', 'Oysters', 'Clams', 'Lobster', 'Crab', 'Shrimp',
+         'Terrapin', 'Frogs legs', 'Eggs', 'Omelette', 'Potatoes', 'Tomatoes', 'Asparagus', 'Spinach',
+         'Cauliflower', 'Cabbage', 'Onions', 'Beets', 'Carrots', 'Turnips', 'Corn', 'String beans', 'Lima beans',
+         'Rice', 'Macaroni', 'Noodles', 'Mushrooms', 'Artichokes', 'Peas', 'Squash', 'Sweet potatoes', 'Apples',
+         'Peaches', 'Pears', 'Cherries', 'Grapefruit', 'Bananas', 'Figs', 'Prunes', 'Pudding', 'Custard',
+         'Pie', 'Cake', 'Tart', 'Fritters', 'Croquettes', 'Cutlets', 'Chops', 'Steak', 'Fillet', 'Stew', 'Soup',
+         'Broth', 'Salad', 'Sandwich', 'Toast', 'Muffins', 'Waffles', 'Pancakes', 'Rolls', 'Biscuits']
+SIDES = ['', 'with cream', 'with butter', 'with bacon', 'with peas', 'with rice', 'with mushrooms',
+         'with tomato sauce', 'with cream sauce', 'with brown sauce', 'with onions', 'with parsley',
+         'on toast', 'au gratin', 'en casserole', 'in cream', 'in jelly', 'in aspic', 'and potatoes',
+         'and eggs', 'and cabbage', 'and beans', 'and greens', 'with lemon', 'with jelly', 'with gravy']
+STYLES = ['', 'a la Maryland', 'a la Newburg', 'a la King', 'a la Creole', 'a la Parisienne', 'Bordelaise',
+          'Hollandaise', 'Bearnaise', 'Lyonnaise', 'Provencale', 'Milanaise', 'Jardiniere', 'Florentine',
+          'Americaine', 'Chasseur', 'Normande', 'Colbert', 'Meuniere', 'Southern style', 'Virginia style',
+          'Boston style', 'Country style', 'Home made', 'Special']
+SPONSORS = ['Waldorf Astoria', 'Hotel Manhattan', 'Norddeutscher Lloyd Bremen', 'Hotel Astor', 'Delmonico\'s',
+            'Hotel Netherland', 'Fifth Avenue Hotel', 'Hamburg-Amerika Linie', 'Hotel Savoy', 'Cunard Line',
+            'Union Pacific Railroad', 'Hotel Imperial', 'The Plaza', 'Hotel Knickerbocker', 'Sherry\'s',
+            'Hotel St. Regis', 'Pennsylvania Railroad', 'Grand Union Hotel', 'Hotel Belmont', 'Rector\'s']
+VENUES = ['COMMERCIAL', 'SOCIAL', 'PROFESSIONAL', 'GOVERNMENT', 'MILITARY', 'EDUCATIONAL', 'RELIGIOUS',
+          'PATRIOTIC', 'RAILROAD', 'STEAMSHIP']
+EVENTS = ['BREAKFAST', 'LUNCH', 'DINNER', 'SUPPER', 'DAILY MENU', 'BANQUET', 'ANNUAL DINNER']
+
+
+def _chunk_rng(seed, table, chunk):
+    return np.random.default_rng([seed, sum(map(ord, table)), chunk])
+
+
+def dish_names(ids):
+    """
+    Raw (uncleaned) dish name for each dish id; ids are popularity ranks.
+
+    The first ids are the HEAD dishes. After that every 7th id is a
+    spelling variant of a more popular dish (id // 7), and the rest are
+    unique combinations of preparation, food, side and style, decoded from
+    the id in mixed radix so distinct ids give distinct names.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    names = np.empty(len(ids), dtype=object)
+    head = ids <= len(HEAD)
+    names[head] = np.asarray(HEAD, dtype=object)[ids[head] - 1]
+
+    variant = ~head & (ids % 7 == 0)
+    if variant.any():
+        base = pd.Series(dish_names(ids[variant] // 7))
+        style = ids[variant] % 5
+        names[variant] = np.select(
+            [style == 0, style == 1, style == 2, style == 3],
+            [base.str.upper(), base.str.lower() + '.', base.str.replace(' ', '  ') + ' ', '"' + base + '"'],
+            base.str.title() + ',').astype(object)
+
+    combo = ~head & ~variant
+    n = ids[combo] - len(HEAD)
+    parts = []
+    for words in (PREPARATIONS, FOODS, SIDES, STYLES):
+        parts.append(np.asarray(words, dtype=object)[n % len(words)])
+        n = n // len(words)
+    text = pd.Series(parts[0]) + ' ' + parts[1] + ' ' + parts[2] + ' ' + parts[3]
+    text = text.str.split().str.join(' ')
+    # Beyond the vocabulary's combinations, a serial keeps names unique
+    overflow = n > 0
+    text[overflow] = text[overflow] + ' No. ' + n[overflow].astype(str)
+    names[combo] = text.to_numpy(dtype=object)
+    return names
+
+
+def sample_dishes(rng, n_items, n_dishes):
+    """Dish ids for n_items menu items drawn from the power-law popularity (inverse CDF)."""
+    power = 1.0 - POP_EXPONENT
+    low = (1 + POP_OFFSET) ** power
+    high = (n_dishes + 1 + POP_OFFSET) ** power
+    ranks = np.floor((low + rng.random(n_items) * (high - low)) ** (1 / power) - POP_OFFSET)
+    return np.clip(ranks, 1, n_dishes).astype(np.int64)
+
+
+def menu_dates(rng, n):
+    """Menu dates concentrated in the 1900s-1910s with a long tail to 1851-2012."""
+    kind = rng.random(n)
+    years = np.where(kind < 0.6, rng.normal(1906, 6, n),
+                     np.where(kind < 0.85, rng.normal(1935, 25, n), rng.uniform(1851, 2013, n)))
+    years = np.clip(years, 1851, 2012).astype(np.int64)
+    dates = pd.Series([f"{y:04d}-{m:02d}-{d:02d}" for y, m, d in
+                       zip(years, rng.integers(1, 13, n), rng.integers(1, 29, n))], dtype=object)
+    dates[rng.random(n) < 0.04] = np.nan
+    # A few typos of the kind found in the real export
+    typos = rng.random(n) < 0.0005
+    dates[typos] = dates[typos].str.replace(r'^1', '0', regex=True)
+    return dates
+
+
+def make_menus(rng, n_menus):
+    sponsors = rng.choice(np.asarray(SPONSORS + [None], dtype=object), n_menus,
+                          p=np.r_[np.full(len(SPONSORS), 0.85 / len(SPONSORS)), 0.15])
+    page_count = rng.integers(1, 9, n_menus)
+    dates = menu_dates(rng, n_menus)
+    dollars = rng.random(n_menus) < 0.65
+    return pd.DataFrame({
+        'id': np.arange(MENU_ID_START, MENU_ID_START + n_menus),
+        'name': np.where(rng.random(n_menus) < 0.3, sponsors, None),
+        'sponsor': sponsors,
+        'event': rng.choice(np.asarray(EVENTS + [None], dtype=object), n_menus),
+        'venue': np.where(rng.random(n_menus) < 0.5, rng.choice(VENUES, n_menus), None),
+        'place': np.where(rng.random(n_menus) < 0.4, 'NY', None),
+        'physical_description': 'CARD; 4.75X7.5;',
+        'occasion': None,
+        'notes': None,
+        'call_number': [f"{str(d)[:4] if isinstance(d, str) else '1900'}-{i:04d}" for i, d in
+                        enumerate(dates)],
+        'keywords': None,
+        'language': None,
+        'date': dates,
+        'location': np.where(pd.isna(sponsors), 'Unknown', sponsors),
+        'location_type': None,
+        'currency': np.where(dollars, 'Dollars', None),
+        'currency_symbol': np.where(dollars, '$', None),
+        'status': 'complete',
+        'page_count': page_count,
+        'dish_count': page_count * rng.integers(5, 40, n_menus),
+    })
+
+
+def make_pages(rng, n_pages, menu_ids):
+    return pd.DataFrame({
+        'id': np.arange(PAGE_ID_START, PAGE_ID_START + n_pages),
+        'menu_id': rng.choice(menu_ids, n_pages),
+        'page_number': rng.integers(1, 9, n_pages),
+        'image_id': rng.integers(1_000_000, 5_000_000, n_pages),
+        'full_height': rng.integers(2000, 6000, n_pages),
+        'full_width': rng.integers(1500, 4500, n_pages),
+        'uuid': [f"{x:032x}" for x in rng.integers(0, 2**62, n_pages)],
+    })
+
+
+def _years_by_page(menus, pages):
+    menu_years = pd.to_numeric(menus['date'].str[:4], errors='coerce')
+    years = menu_years.set_axis(menus['id']).reindex(pages['menu_id']).to_numpy()
+    return np.where((years >= 1851) & (years <= 2012), years, 1900)
+
+
+def make_items(rng, first_id, n, page_ids, page_years, n_dishes):
+    """One chunk of raw MenuItem rows and their dish ids and years."""
+    page = rng.integers(0, len(page_ids), n)
+    dish_ids = sample_dishes(rng, n, n_dishes)
+    years = page_years[page]
+
+    # Base price per dish, inflated ~2% a year from 1850, with noise
+    base = 0.05 + (dish_ids * 2654435761 % 1000) / 1000 * 0.6
+    price = np.round(base * 1.02 ** (years - 1850) * rng.lognormal(0, 0.3, n), 2)
+    price = np.maximum(price, 0.01)
+    price[rng.random(n) >= PRICE_COVERAGE] = np.nan
+    high_price = np.where(rng.random(n) < RANGE_SHARE, np.round(price * rng.choice([1.5, 2.0], n), 2), np.nan)
+    # Raw-export defects fixed by the OpenRefine workflow (max(0, price))
+    price[rng.random(n) < 0.0002] *= -1
+
+    items = pd.DataFrame({
+        'id': np.arange(first_id, first_id + n),
+        'menu_page_id': page_ids[page],
+        'price': price,
+        'high_price': high_price,
+        'dish_id': pd.array(dish_ids, dtype='Int64'),
+        'created_at': '2011-03-28 15:00:44 UTC',
+        'updated_at': '2011-04-19 04:33:15 UTC',
+        'xpos': np.round(rng.random(n), 6),
+        'ypos': np.round(rng.random(n), 6),
+    })
+    items.loc[rng.random(n) < 0.0003, 'dish_id'] = pd.NA
+    return items, dish_ids, years, price
+
+
+def make_dishes(first_id, stop_id, stats):
+    ids = np.arange(first_id, stop_id)
+    index = ids - 1
+    times = stats['times'][index]
+    seen = times > 0
+    return pd.DataFrame({
+        'id': ids,
+        'name': dish_names(ids),
+        'description': None,
+        'menus_appeared': np.maximum(np.floor(times * 0.97), np.minimum(times, 1)).astype(np.int64),
+        'times_appeared': times,
+        'first_appeared': np.where(seen, stats['first'][index], 0),
+        'last_appeared': np.where(seen, stats['last'][index], 0),
+        'lowest_price': np.where(np.isfinite(stats['low'][index]), stats['low'][index], np.nan),
+        'highest_price': np.where(np.isfinite(stats['high'][index]), stats['high'][index], np.nan),
+    })
+
+
+def generate(out_dir, scale=1.0, seed=0, chunk_rows=CHUNK_ROWS, cleaned=True):
+    """
+    Write Menu, MenuPage, MenuItem and Dish CSVs with the real schemas to out_dir.
+
+    Table sizes are the real export's times `scale`. Dish popularity is a
+    power law with the real head (Coffee, Tea, Celery, ...) and a tail of
+    spelling variants. About 25% of menu items are priced, prices rise
+    with the menu's year, and menu dates cluster in the 1900s-1910s.
+    MenuItem and Dish are written in chunks of chunk_rows, so memory does
+    not grow with scale. With cleaned=True the cleaned files are produced
+    by replaying the recorded OpenRefine workflows (refine_replay.py).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    sizes = {table: max(1, round(n * scale)) for table, n in REAL_SIZES.items()}
+    start = time.perf_counter()
+
+    rng = _chunk_rng(seed, 'Menu', 0)
+    menus = make_menus(rng, sizes['Menu'])
+    pages = make_pages(rng, sizes['MenuPage'], menus['id'].to_numpy())
+    menus.to_csv(os.path.join(out_dir, 'Menu.csv'), index=False)
+    pages.to_csv(os.path.join(out_dir, 'MenuPage.csv'), index=False)
+    page_ids, page_years = pages['id'].to_numpy(), _years_by_page(menus, pages)
+
+    n_dishes = sizes['Dish']
+    stats = {'times': np.zeros(n_dishes, dtype=np.int64),
+             'first': np.full(n_dishes, 9999), 'last': np.zeros(n_dishes, dtype=np.int64),
+             'low': np.full(n_dishes, np.inf), 'high': np.full(n_dishes, -np.inf)}
+    item_path = os.path.join(out_dir, 'MenuItem.csv')
+    for chunk, first in enumerate(range(0, sizes['MenuItem'], chunk_rows)):
+        n = min(chunk_rows, sizes['MenuItem'] - first)
+        items, dish_ids, years, price = make_items(_chunk_rng(seed, 'MenuItem', chunk), first + 1, n,
+                                                   page_ids, page_years, n_dishes)
+        index = dish_ids - 1
+        stats['times'] += np.bincount(index, minlength=n_dishes)
+        np.minimum.at(stats['first'], index, years)
+        np.maximum.at(stats['last'], index, years)
+        priced = price >= 0
+        np.minimum.at(stats['low'], index[priced], price[priced])
+        np.maximum.at(stats['high'], index[priced], price[priced])
+        items.to_csv(item_path, mode='w' if chunk == 0 else 'a', header=chunk == 0, index=False)
+
+    dish_path = os.path.join(out_dir, 'Dish.csv')
+    for chunk, first in enumerate(range(1, n_dishes + 1, chunk_rows)):
+        dishes = make_dishes(first, min(first + chunk_rows, n_dishes + 1), stats)
+        dishes.to_csv(dish_path, mode='w' if chunk == 0 else 'a', header=chunk == 0, index=False)
+
+    print(f"Generated {', '.join(f'{n:,} {table}' for table, n in sizes.items())} rows "
+          f"(scale {scale:g}) in {out_dir} in {time.perf_counter() - start:.1f}s")
+
+    if cleaned:
+        for history, raw, clean in WORKFLOWS.values():
+            replay(history, os.path.join(out_dir, raw), os.path.join(out_dir, clean))
+    return sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic menu dataset with the real schemas")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiple of the real 1.3M-item export")
+    parser.add_argument('--out', default=None, help="output directory (default synthetic/<scale>x)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-cleaned', action='store_true',
+                        help="skip writing MenuItem-cleaned.csv and Dish-cleaned.csv")
+    args = parser.parse_args()
+    generate(args.out or os.path.join('synthetic', f"{args.scale:g}x"), args.scale, args.seed,
+             cleaned=not args.no_cleaned)
@@ -0,0 +1,96 @@
+import time
+
+import pandas as pd
+
+from data_cache import load_table
+
+# Columns each table contributes to the analysis, with compact dtypes.
+# Keys that may be missing use pandas' nullable Int32. Prices stay float64:
+# float32 cannot hold values like 0.4 exactly, and the widened value would
+# leak into avg_price and final_cleaned_dataset.csv.
+TABLE_SCHEMAS = {
+    'Menu': {
+        'id': 'int32',
+        'date': 'object',
+        'location': 'category',
+        'venue': 'category',
+    },
+    'MenuPage': {
+        'id': 'int32',
+        'menu_id': 'Int32',
+    },
+    'MenuItem': {
+        'id': 'int32',
+        'menu_page_id': 'Int32',
+        'price': 'float64',
+        'high_price': 'float64',
+        'dish_id': 'Int32',
+    },
+    'Dish': {
+        'id': 'int32',
+        'name': 'category',
+        'times_appeared': 'int32',
+        'menus_appeared': 'int32',
+    },
+}
+
+# Source file for each table in the analysis; the raw MenuItem.csv and
+# Dish.csv share the schemas of their cleaned counterparts
+SOURCE_FILES = {
+    'Menu': 'Menu.csv',
+    'MenuPage': 'MenuPage.csv',
+    'MenuItem': 'MenuItem-cleaned.csv',
+    'Dish': 'Dish-cleaned.csv',
+}
+
+
+def read_options(table):
+    """
+    pd.read_csv keyword arguments that apply the table's schema.
+
+    Nullable integer columns are parsed as float64. pandas' nullable-integer
+    parser is much slower, so apply_schema() converts them afterwards.
+    """
+    schema = TABLE_SCHEMAS[table]
+    dtype = {column: 'float64' if dtype == 'Int32' else dtype for column, dtype in schema.items()}
+    return {'usecols': list(schema), 'dtype': dtype}
+
+
+def apply_schema(df, table):
+    """Convert a frame read with read_options() to the schema's final dtypes."""
+    return df.astype(TABLE_SCHEMAS[table])
+
+
+def load_source(table, path=None):
+    """Load a table's pruned, typed columns through the columnar cache."""
+    return load_table(path or SOURCE_FILES[table], astype=TABLE_SCHEMAS[table], **read_options(table))
+
+
+def compare_loading(tables=SOURCE_FILES):
+    """Time and size a full pd.read_csv against the schema-pruned one."""
+    print(f"{'Table':<10} {'Full MB':>9} {'Pruned MB':>10} {'Full s':>8} {'Pruned s':>9}")
+    print("-" * 50)
+    totals = [0.0, 0.0, 0.0, 0.0]
+    for table, path in tables.items():
+        start = time.perf_counter()
+        full = pd.read_csv(path)
+        full_secs = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pruned = apply_schema(pd.read_csv(path, **read_options(table)), table)
+        pruned_secs = time.perf_counter() - start
+
+        full_mb = full.memory_usage(deep=True).sum() / 1e6
+        pruned_mb = pruned.memory_usage(deep=True).sum() / 1e6
+        for i, value in enumerate((full_mb, pruned_mb, full_secs, pruned_secs)):
+            totals[i] += value
+        print(f"{table:<10} {full_mb:>9.1f} {pruned_mb:>10.1f} {full_secs:>8.2f} {pruned_secs:>9.2f}")
+
+    print("-" * 50)
+    print(f"{'Total':<10} {totals[0]:>9.1f} {totals[1]:>10.1f} {totals[2]:>8.2f} {totals[3]:>9.2f}")
+    print(f"Memory saved: {100 * (1 - totals[1] / totals[0]):.1f}%, "
+          f"parse time saved: {100 * (1 - totals[3] / totals[2]):.1f}%")
+
+
+if __name__ == "__main__":
+    compare_loading()
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dish_clusters import cluster_dishes, fingerprint, squashed_key
+from synthetic_data import REAL_SIZES, dish_names
+
+
+def synthetic_catalog(n):
+    """Dish table of synthetic_data's names; ids are popularity ranks."""
+    ids = np.arange(1, n + 1)
+    return pd.DataFrame({'id': ids, 'name': dish_names(ids), 'times_appeared': n - ids + 1})
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    dishes = synthetic_catalog(REAL_SIZES['Dish'])
+    return dishes, cluster_dishes(dishes, verbose=False)
+
+
+def test_largest_cluster_stays_small(catalog):
+    _, mapping = catalog
+    sizes = mapping.groupby('canonical_id').size()
+    # Each dish has a handful of spelling variants; a bigger cluster means distinct dishes merged
+    assert sizes.max() <= 10
+    # Spelling variants still fold in: dish 49 is a variant of dish 7 ("Boiled potatoes")
+    assert mapping.loc[mapping['dish_id'] == 49, 'canonical_id'].item() == 7
+
+
+def test_near_duplicates_do_not_chain():
+    # Jaccard: a~b 0.84, b~c 0.83, but a~c only 0.70
+    dishes = pd.DataFrame({'id': [1, 2, 3],
+                           'name': ['Chicken broth with rice', 'Chicken broth with rice and',
+                                    'Chicken broth with rice and eggs'],
+                           'times_appeared': [30, 20, 10]})
+    mapping = cluster_dishes(dishes, threshold=0.8, verbose=False)
+    assert mapping['canonical_id'].tolist() == [1, 1, 3]
+
+
+def test_members_share_a_key_with_their_canonical_dish(catalog):
+    dishes, mapping = catalog
+    keys = pd.DataFrame({'fingerprint': fingerprint(dishes['name']).to_numpy(),
+                         'squashed': squashed_key(dishes['name']).to_numpy()}, index=dishes['id'])
+    member = keys.loc[mapping['dish_id']].to_numpy()
+    canonical = keys.loc[mapping['canonical_id']].to_numpy()
+    assert ((member == canonical).any(axis=1)).all()
+
+
+def test_distinct_dishes_stay_separate():
+    # Each pair has the same character bigram set
+    pairs = [('Squab', 'Squash'), ('Iced Spinach', 'Spiced Spinach'), ('Hot Broth', 'Roast Broth'),
+             ('Imported Toast', 'Imported Tart'), ('Glazed Potatoes And Potatoes', 'Glazed Potatoes')]
+    names = [name for pair in pairs for name in pair] + ['Ice Cream', 'icecream', 'Ice-Cream.']
+    dishes = pd.DataFrame({'id': np.arange(1, len(names) + 1), 'name': names,
+                           'times_appeared': np.arange(len(names), 0, -1)})
+    canonical = cluster_dishes(dishes, verbose=False).set_index('dish_id')['canonical_id']
+    assert (canonical.iloc[:len(pairs) * 2] == canonical.index[:len(pairs) * 2]).all()
+    # Spacing and punctuation still fold together
+    assert canonical.iloc[-3:].tolist() == [len(names) - 2] * 3
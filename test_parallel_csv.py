@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+import parallel_csv
+from parallel_csv import read_csv_parallel
+
+
+def test_matches_read_csv_including_categories(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    n = 5_000
+    source = tmp_path / 'menus.csv'
+    pd.DataFrame({
+        'id': np.arange(n),
+        # Later ranges see values ('zeta', 'alpha') before earlier ones do
+        'venue': np.where(np.arange(n) < n // 2, rng.choice(['SOCIAL', 'MILITARY'], n),
+                          rng.choice(['zeta', 'COMMERCIAL', 'alpha'], n)),
+        'place': rng.choice(['Hotel "Astor", NY', 'Delmonico\'s', 'Waldorf\nAstoria', None], n),
+        'price': np.where(rng.random(n) < 0.7, np.nan, rng.random(n).round(2)),
+    }).to_csv(source, index=False)
+    monkeypatch.setattr(parallel_csv, 'MIN_PARALLEL_BYTES', 0)
+
+    options = {'dtype': {'venue': 'category', 'place': 'category'}}
+    expected = pd.read_csv(source, **options)
+    result = read_csv_parallel(str(source), workers=4, **options)
+    pd.testing.assert_frame_equal(result, expected)
+    for name in ('venue', 'place'):
+        assert result[name].cat.categories.equals(expected[name].cat.categories)
+        assert (result[name].cat.codes == expected[name].cat.codes).all()
@@ -0,0 +1,23 @@
+import numpy as np
+
+from quantile_sketch import QUANTILES, KLLSketch, rank_error
+
+
+def test_exact_answer_has_no_rank_error():
+    # np.quantile interpolates: [1, 2] at q=0.1 is 1.1, between the two values
+    assert rank_error(np.array([1.0, 2.0]), 1.1, 0.1) == 0.0
+    ordered = np.sort(np.random.default_rng(0).integers(0, 50, 1001) / 4)
+    for q in np.linspace(0, 1, 21):
+        assert rank_error(ordered, np.quantile(ordered, q), q) == 0.0
+
+
+def test_wrong_answer_has_rank_error():
+    ordered = np.arange(100.0)
+    assert rank_error(ordered, 89.0, 0.5) > 0.38
+
+
+def test_uncompacted_sketch_is_exact():
+    values = np.random.default_rng(1).lognormal(size=500)
+    sketch = KLLSketch(1000).update(values)
+    for q, estimate in zip(QUANTILES, sketch.quantiles(QUANTILES)):
+        assert rank_error(np.sort(values), estimate, q) == 0.0
@@ -0,0 +1,25 @@
+import os
+
+import numpy as np
+
+from refine_replay import WORKFLOWS, Cells, compile_expression, replay
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_regex_classes_are_ascii_only():
+    # Java's \w doesn't match accented letters, so OpenRefine strips them
+    strip = compile_expression('''value.replace(/[^\\w\\s&'-]/, "")''')
+    cells = strip(Cells.from_strings(np.array(['Café au lait', 'Crème brûlée', "Ham & Eggs"], dtype=object)))
+    assert cells.as_text().tolist() == ['Caf au lait', 'Crme brle', 'Ham & Eggs']
+
+
+def test_dish_workflow_on_non_ascii_names(tmp_path):
+    source = tmp_path / 'Dish.csv'
+    source.write_text('id,name,first_appeared,last_appeared,lowest_price,highest_price\n'
+                      '1,Café au lait,1900,1910,0.1,0.2\n'
+                      '2,Purée of peas,,,,\n', encoding='utf-8')
+    output = tmp_path / 'Dish-cleaned.csv'
+    replay(os.path.join(HERE, WORKFLOWS['Dish'][0]), str(source), str(output))
+    lines = output.read_text(encoding='utf-8').splitlines()
+    assert [line.split(',')[1] for line in lines[1:]] == ['Caf Au Lait', 'Pure Of Peas']